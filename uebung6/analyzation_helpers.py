@@ -1,5 +1,9 @@
+import heapq
 import string
-import datetime
+import numpy as np
+import time_buckets
+import token_columns
+import token_index
 
 
 def get_wrongly_classified_tweets(tweets_list: list) -> list:
@@ -24,12 +28,19 @@ def get_wrongly_classified_tweets(tweets_list: list) -> list:
     return wrongly_classified_tweets
 
 
-def get_most_frequent_words(tweets_list: list) -> list:
+def get_most_frequent_words(tweets_list: list, columns: token_columns.TokenColumns = None) -> list:
     """
     Returns 10 most common words and number of their occasions (as tuple) in tweets list.
+    If the tokens of the tweets are saved in token columns ("tokens-row", see token_columns.py),
+    the columns of the preprocessed file have to be given.
     :param tweets_list: list
+    :param columns: token_columns.TokenColumns
     :return: most_frequent_words: list
     """
+    if columns is not None:
+        words_frequency = count_words_in_columns(tweets_list, columns)
+        print("\nMost frequent words in wrongly classified tweets:")
+        return get_top10(words_frequency)
 
     words_frequency = {}
     for tweet in tweets_list:
@@ -68,6 +79,38 @@ def get_most_frequent_words(tweets_list: list) -> list:
     return most_frequent_words
 
 
+def count_words_in_columns(tweets_list: list, columns: token_columns.TokenColumns) -> dict:
+    """
+    Counts the words of the tweets like get_most_frequent_words (no stop words, punctuation, white space
+    or other non-alphabetic tokens), but on whole token columns: each distinct token text is checked once.
+    Returns dict word -> frequency in order of first occurrence.
+    :param tweets_list: list
+    :param columns: token_columns.TokenColumns
+    :return: words_frequency: dict
+    """
+    positions = columns.positions([tweet["tokens-row"] for tweet in tweets_list])
+    is_word = np.array([token_index.is_word(text) for text in columns.vocabulary("text")], dtype=bool)
+    text_codes = columns.column("text", positions)
+    counted = ~columns.column("stop", positions) & is_word[text_codes]
+    return columns.count_values("text", positions[counted])
+
+
+def get_most_frequent_words_in_subset(index: token_index.TokenIndex, tweet_ids=None) -> list:
+    """
+    Returns 10 most common words and number of their occasions (as tuple) in the tweets tweet_ids
+    (positions in the tweet list of index, default: all tweets), e.g. index.wrongly_classified_tweets(),
+    index.tweets_with_hashtag(hashtag), index.tweets_of_user(user), index.tweets_between(start, end)
+    or an intersection of those (index.intersect). Same result as get_most_frequent_words on a list of these tweets,
+    but counted from the postings of the index.
+    :param index: token_index.TokenIndex
+    :param tweet_ids: iterable of int
+    :return: most_frequent_words: list
+    """
+    words_frequency = index.word_frequencies(tweet_ids)
+    print("\nMost frequent words in selected tweets:")
+    return get_top10(words_frequency)
+
+
 def analyze_most_frequent_hashtags(tweets_list: list) -> (list, list):
     """
     Iterates through tweets in tweets_list, and saves all used hashtags.
@@ -191,24 +234,27 @@ def most_frequent_wrongly_classified_hashtags(tweets_list: list) -> list:
     return most_frequent_hashtags_wrongly_classified
 
 
-def analyze_most_active_users(tweets_list: list) -> (list, list):
+def analyze_most_active_users(tweets_list: list, time_zone: str = None) -> (list, list):
     """
     Extracts the 10 users out of tweets_list who authored the highest numbers of tweets.
     Returns list of those users and the distribution of sentiments of their tweets.
-    Second list returned holds the users and distribution of activity on the weekdays.
+    Second list returned holds the users and distribution of activity on the weekdays
+    (in time_zone if given, see time_buckets.parse_created_at).
     :param tweets_list: list
+    :param time_zone: str
     :return: (most_active_users_sentiments, most_active_users_tweet_days): tuple(list, list)
     """
     users_frequency = {}
     users_sentiments = {}
     users_tweet_days = {}
 
-    for tweet in tweets_list:
+    # parse all dates at once, Monday = 0 -> Sunday = 6
+    tweet_weekdays = time_buckets.weekdays(time_buckets.parse_created_at(
+        (tweet["created_at"] for tweet in tweets_list), time_zone)).tolist()
+
+    for tweet, weekday in zip(tweets_list, tweet_weekdays):
         user = tweet["author_name"]
         sentiment = tweet["predicted-sentiment"]
-        date = tweet["created_at"]
-        date = datetime.datetime.fromisoformat(date.replace("Z", "+00:00"))  # convert to datetime.datetime object
-        weekday = date.weekday()  # Monday = 0 -> Sunday = 6
         try:
             # update users_frequency dict
             frequency = users_frequency.get(user)
@@ -271,106 +317,53 @@ def analyze_most_active_users(tweets_list: list) -> (list, list):
     return most_active_users_sentiments, most_active_users_tweet_days
 
 
+def get_top_k(frequency_dictionary: dict, k: int = 10, min_support: int = None) -> list:
+    """
+    Returns list of the k (key, value) tuples with the highest values in dictionary, highest first.
+    Keys with equal values are ordered by their position in the dictionary (first inserted first).
+    If min_support is given, only keys with at least this value are returned (so the list can be shorter than k).
+    The dictionary is not changed. Runs in O(n log k) with a heap of size k.
+    :param frequency_dictionary: dict
+    :param k: int
+    :param min_support: int
+    :return: most_frequent_list: list
+    """
+    items = frequency_dictionary.items()
+    if min_support is not None:
+        items = ((key, value) for key, value in items if value >= min_support)
+    top_items = heapq.nlargest(k, enumerate(items), key=lambda indexed_item: (indexed_item[1][1], -indexed_item[0]))
+    return [item for position, item in top_items]
+
+
 def get_top10(frequency_dictionary: dict) -> list:
     """
-    Returns list of 10 (key, value) tuples of the keys with highest values in dictionary.
+    Returns list of 10 (key, value) tuples of the keys with highest values in dictionary and prints them.
+    Only keys with a value of at least 1 are returned; the dictionary is not changed (see get_top_k).
     :param frequency_dictionary: dict
     :return: most_frequent_list: list
     """
-    max_value = 0
-    max_key = None
-    most_frequent_list = []
-    for i in range(10):
-        for key in frequency_dictionary:
-            if frequency_dictionary.get(key) > max_value:
-                max_key = key
-                max_value = frequency_dictionary.get(key)
-        print("No.", i + 1, ": ", max_key, "with", max_value, "occurrences.")
-        most_frequent_list.append((max_key, max_value))
-        del frequency_dictionary[max_key]
-        max_value = 0
-        max_key = None
+    most_frequent_list = get_top_k(frequency_dictionary, 10, min_support=1)
+    for i, (key, value) in enumerate(most_frequent_list):
+        print("No.", i + 1, ": ", key, "with", value, "occurrences.")
     print()
     return most_frequent_list
 
 
-def get_tweet_daily_hourly_frequency(tweets_list: list) -> (dict, dict):
+def get_tweet_daily_hourly_frequency(tweets_list: list, time_zone: str = None) -> (dict, dict):
     """
     Fist dict returned holds the average tweet frequencies for each weekday
     -> weekdays as keys and daily tweet numbers as values
     Second dict returned holds the average number of tweets posted in each hour of a full week.
     -> all hours as keys and daily tweet numbers as values
+    Averages are taken over the days with tweets, the dates are parsed at once and counted with bincount
+    (see time_buckets.py), in time_zone if given.
     :param tweets_list: list
+    :param time_zone: str
     :return: (weekday_tweet_avg, hour_tweet_avg): tuple(dict, dict):
     """
-
-    tweets_days_hours = {}  # holds each day mentioned with hours list in tweet_list
-    for tweet in tweets_list:
-        date = tweet["created_at"]
-        date = datetime.datetime.fromisoformat(date.replace("Z", "+00:00"))
-        day = date.date()
-        hour = date.hour
-
-        try:
-            day_hours_list = tweets_days_hours.get(day)
-            new_hour_val = day_hours_list[hour] + 1
-            day_hours_list[hour] = new_hour_val
-            tweets_days_hours[day] = day_hours_list
-
-        except Exception:
-            init_day_hours_list = []
-            for i in range(24):
-                init_day_hours_list.append(0)  # initialze num of tweets for each hour of new day with 0
-            init_day_hours_list[hour] = 1  # set tweet counter on the right hour of the day to 1
-            tweets_days_hours[day] = init_day_hours_list
-
-    weekday_tweet_lists = {0: [],  # save lists in a list for each weekday
-                           1: [],
-                           2: [],
-                           3: [],
-                           4: [],
-                           5: [],
-                           6: []}
-
-    for day in tweets_days_hours:
-        weekday = day.weekday()
-        day_hours = tweets_days_hours.get(day)
-        # weekday_day_hours = weekday_tweet_lists.get(weekday)
-        # new_weekday_day_hours = [sum(x) for x in zip(day_hours, weekday_day_hours)]
-        weekday_tweet_lists[weekday].append(day_hours)
-
-    # For the average tweet occcurences of each hour:
-    hour_keys = range(168)
-    hour_tweet_avg = dict.fromkeys(hour_keys)
-
-    # For the average tweet occcurences of each weekday:
-    day_keys = range(7)  # Monday = 0 ...Sunday = 6
-    weekday_tweet_avg = dict.fromkeys(day_keys)
-
-    hour_of_168 = 0
-    for weekday in weekday_tweet_lists:
-        total_hour_tweets = []
-        for i in range(24):
-            total_hour_tweets.append(0)
-
-        weekday_lists = weekday_tweet_lists.get(weekday)
-        total_weekday_occurences = len(weekday_lists)
-        total_weekday_tweets = 0
-
-        for day_list in weekday_lists:
-            total_weekday_tweets += sum(day_list)
-
-            total_hour_tweets = [sum(x) for x in zip(day_list, total_hour_tweets)]
-
-        for hour in total_hour_tweets:
-            hour_avg = round(hour / total_weekday_occurences)
-            hour_tweet_avg[hour_of_168] = hour_avg
-            hour_of_168 += 1
-            print(hour_of_168)
-
-        average_tweets_weekday = round(total_weekday_tweets / total_weekday_occurences)
-        weekday_tweet_avg[weekday] = average_tweets_weekday
-
+    times = time_buckets.parse_created_at((tweet["created_at"] for tweet in tweets_list), time_zone)
+    weekday_tweet_avg = time_buckets.week_bin_averages(times, np.timedelta64(1, "D"))
+    hour_tweet_avg = time_buckets.week_bin_averages(times, np.timedelta64(1, "h"))
 
     print(hour_tweet_avg)
     return weekday_tweet_avg, hour_tweet_avg
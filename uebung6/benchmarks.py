@@ -0,0 +1,280 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import time
+import numpy as np
+import torch
+import analyzation_helpers
+import columnar_analysis
+import feature_store
+import ffnetwork
+import heavy_hitters
+import parallel_preprocessor
+import preprocessor
+import token_columns
+import tweet_summary
+from embedding_store import EmbeddingStore
+
+
+def benchmark_pipe_configurations(data_preprocessor: preprocessor.TweetPreprocessor, infile_path: str,
+                                  configurations: list) -> list:
+    """
+    Measures spacy throughput (tokenizing, tagging and embedding lookup) of the tweets in infile_path
+    for each (batch_size, n_process) configuration.
+    Returns list of (batch_size, n_process, tweets_per_second) tuples.
+    :param data_preprocessor: preprocessor.TweetPreprocessor
+    :param infile_path: str
+    :param configurations: list of (batch_size, n_process) tuples
+    :return: results: list
+    """
+    with open(infile_path, mode="r", encoding="utf-8") as fin:
+        tweets_list = json.load(fin)
+
+    results = []
+    for batch_size, n_process in configurations:
+        start_time = time.perf_counter()
+        for tweet_text_doc, tweet in data_preprocessor.pipe_tweets(tweets_list, batch_size, n_process):
+            data_preprocessor.convert_doc(tweet_text_doc)
+        tweets_per_second = preprocessor.print_throughput(len(tweets_list), time.perf_counter() - start_time,
+                                                          batch_size, n_process)
+        results.append((batch_size, n_process, tweets_per_second))
+
+    print("\nThroughput report (tweets per second):")
+    print("batch_size, n_process, tweets/s")
+    for batch_size, n_process, tweets_per_second in results:
+        print(batch_size, n_process, round(tweets_per_second, 1))
+    return results
+
+
+def benchmark_parallel_preprocessing(data_preprocessor: preprocessor.TweetPreprocessor, infile_path: str,
+                                     model: ffnetwork.FeedForwardNetwork, tweet_representation: str,
+                                     worker_counts: list, shard_size: int = 1000, columnar_tokens: bool = False) -> list:
+    """
+    Measures the speedup of parallel_preprocessor.preprocess_parallel for each number of worker processes
+    compared to one worker. Returns list of (n_workers, seconds, speedup) tuples.
+    The output file and its sidecars are deleted afterwards.
+    :param data_preprocessor: preprocessor.TweetPreprocessor
+    :param infile_path: str
+    :param model: ffnetwork.FeedForwardNetwork
+    :param tweet_representation: str
+    :param worker_counts: list of int
+    :param shard_size: int
+    :param columnar_tokens: bool
+    :return: results: list
+    """
+    outfile_path = infile_path + ".benchmark_parallel.json"
+    results = []
+    for n_workers in worker_counts:
+        start_time = time.perf_counter()
+        parallel_preprocessor.preprocess_parallel(data_preprocessor, infile_path, outfile_path, model,
+                                                  tweet_representation, n_workers, shard_size,
+                                                  columnar_tokens=columnar_tokens)
+        results.append((n_workers, time.perf_counter() - start_time))
+    os.remove(outfile_path)
+    os.remove(feature_store.features_path(outfile_path))
+    if columnar_tokens:
+        for path in token_columns.token_columns_paths(outfile_path).values():
+            os.remove(path)
+
+    print("\nParallel preprocessing report:")
+    print("n_workers, seconds, speedup")
+    base_seconds = results[0][1] * results[0][0]
+    results = [(n_workers, seconds, base_seconds / seconds) for n_workers, seconds in results]
+    for n_workers, seconds, speedup in results:
+        print(n_workers, round(seconds, 2), round(speedup, 2))
+    return results
+
+
+def compare_quantized_predictions(embeddings_path: str, infile_path: str, model: ffnetwork.FeedForwardNetwork,
+                                  tweet_representation: str, dtypes: list = ("float16", "int8")) -> list:
+    """
+    Accuracy check for quantized embedding tables: predicts the sentiment of all tweets in infile_path
+    (annotated, e.g. filtered_test.json) with the float32 table and with each quantized table.
+    Reports per dtype the table size, the share of predictions equal to the float32 predictions,
+    the accuracy against the annotations and the largest difference of a tweet vector.
+    Returns list of (dtype, nbytes, agreement, accuracy, max_vector_error) tuples.
+    :param embeddings_path: str
+    :param infile_path: str
+    :param model: ffnetwork.FeedForwardNetwork
+    :param tweet_representation: str
+    :param dtypes: list of str
+    :return: results: list
+    """
+    full_precision_preprocessor = preprocessor.TweetPreprocessor(embeddings_path)
+    with open(infile_path, mode="r", encoding="utf-8") as fin:
+        tweets_list = json.load(fin)
+    token_texts = [[token.text for token in doc] for doc in
+                   full_precision_preprocessor.pipeline("tokenize").pipe(tweet["text"] for tweet in tweets_list)]
+
+    results = []
+    reference_vectors = reference_predictions = None
+    for dtype in ["float32"] + list(dtypes):
+        store = EmbeddingStore.from_vec_file(embeddings_path, dtype)
+        vectors, annotations = [], []
+        for tweet, texts in zip(tweets_list, token_texts):
+            indices = store.lookup(texts)
+            if indices.size:  # tweets without fasttext tokens are dropped like in preprocessing
+                vectors.append(store.pool(indices, tweet_representation))
+                annotations.append(tweet["annotation"])
+        vectors = np.stack(vectors)
+        predictions = ffnetwork.predict_nn(model, vectors)
+        if reference_predictions is None:
+            reference_vectors, reference_predictions = vectors, predictions
+        agreement = float(np.mean(predictions == reference_predictions))
+        accuracy = float(np.mean(predictions == np.array(annotations)))
+        max_vector_error = float(np.abs(vectors - reference_vectors).max())
+        results.append((dtype, store.nbytes(), agreement, accuracy, max_vector_error))
+
+    print("\nQuantized embeddings report:")
+    print("dtype, table size (MB), agreement with float32 predictions, accuracy, max tweet vector error")
+    for dtype, nbytes, agreement, accuracy, max_vector_error in results:
+        print(dtype, round(nbytes / 2 ** 20, 1), str(round(agreement * 100, 2)) + "%",
+              str(round(accuracy * 100, 2)) + "%", round(max_vector_error, 5))
+    return results
+
+
+def synthetic_tweets(num_tweets: int, num_users: int = 50000, num_hashtags: int = 5000, seed: int = 0) -> list:
+    """
+    Generates preprocessed tweets with random author, predicted sentiment, creation time (within 8 weeks)
+    and 0 to 3 hashtags for the analysis benchmarks.
+    :param num_tweets: int
+    :param num_users: int
+    :param num_hashtags: int
+    :param seed: int
+    :return: tweets_list: list
+    """
+    random_state = np.random.default_rng(seed)
+    users = random_state.zipf(1.5, num_tweets) % num_users
+    sentiments = random_state.integers(0, 3, num_tweets)
+    seconds = random_state.integers(0, 8 * 7 * 24 * 3600, num_tweets)
+    created_at = np.datetime_as_string(np.datetime64("2021-05-03T00:00:00") + seconds.astype("timedelta64[s]"))
+    num_tweet_hashtags = random_state.integers(0, 4, num_tweets)
+    hashtags = (random_state.zipf(1.5, num_tweet_hashtags.sum()) % num_hashtags).tolist()
+
+    tweets_list = []
+    position = 0
+    for i in range(num_tweets):
+        tweet_hashtags = ["#tag" + str(hashtag) for hashtag in hashtags[position:position + num_tweet_hashtags[i]]]
+        position += num_tweet_hashtags[i]
+        tweets_list.append({"author_name": "user" + str(users[i]), "predicted-sentiment": int(sentiments[i]),
+                            "created_at": created_at[i] + ".000Z", "hashtags": tweet_hashtags})
+    return tweets_list
+
+
+def benchmark_columnar_analysis(num_tweets: int = 1000000) -> list:
+    """
+    Compares the dict based functions in analyzation_helpers with columnar_analysis.TweetTable
+    on num_tweets synthetic tweets and checks that both return the same results.
+    Returns list of (analysis, seconds with dicts, seconds with columns, speedup) tuples;
+    building the table is reported as its own row.
+    :param num_tweets: int
+    :return: results: list
+    """
+    tweets_list = synthetic_tweets(num_tweets)
+    analyses = [("users", analyzation_helpers.analyze_most_active_users,
+                 columnar_analysis.TweetTable.most_active_users),
+                ("hashtags", analyzation_helpers.analyze_most_frequent_hashtags,
+                 columnar_analysis.TweetTable.most_frequent_hashtags),
+                ("daily/hourly", analyzation_helpers.get_tweet_daily_hourly_frequency,
+                 columnar_analysis.TweetTable.daily_hourly_frequency)]
+
+    start_time = time.perf_counter()
+    tweet_table = columnar_analysis.TweetTable.from_tweets(tweets_list)
+    results = [("build table", 0.0, time.perf_counter() - start_time, 0.0)]
+    for name, dict_analysis, columnar_method in analyses:
+        with contextlib.redirect_stdout(io.StringIO()):  # the analyses print their results
+            start_time = time.perf_counter()
+            dict_result = dict_analysis(tweets_list)
+            dict_seconds = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            columnar_result = columnar_method(tweet_table)
+            columnar_seconds = time.perf_counter() - start_time
+        if dict_result != columnar_result:
+            raise ValueError("Columnar analysis '" + name + "' differs from analyzation_helpers")
+        results.append((name, dict_seconds, columnar_seconds, dict_seconds / columnar_seconds))
+
+    print("\nColumnar analysis report (" + str(num_tweets) + " tweets, results identical):")
+    print("analysis, seconds with dicts, seconds with columns, speedup")
+    for name, dict_seconds, columnar_seconds, speedup in results:
+        print(name, round(dict_seconds, 3), round(columnar_seconds, 3), round(speedup, 1))
+    return results
+
+
+def benchmark_heavy_hitters(num_tweets: int = 1000000, capacities=(100, 1000, 10000)) -> list:
+    """
+    Compares the approximate top 10 hashtags and users of heavy_hitters (Space-Saving with the given capacities)
+    with the exact counters of tweet_summary.TweetSummary on num_tweets synthetic tweets.
+    Returns list of (statistic, capacity, exact seconds, approximate seconds, kept keys, distinct keys,
+    top 10 keys found, maximal count error in top 10, error bound) tuples.
+    :param num_tweets: int
+    :param capacities: iterable of int
+    :return: results: list
+    """
+    tweets_list = synthetic_tweets(num_tweets)
+    statistics = [("hashtags", "hashtags_frequency", heavy_hitters.approximate_most_frequent_hashtags),
+                  ("users", "users_frequency", heavy_hitters.approximate_most_active_users)]
+
+    results = []
+    for statistic, counter_name, approximate_analysis in statistics:
+        start_time = time.perf_counter()
+        summary = tweet_summary.TweetSummary([statistic]).add_tweets(tweets_list)
+        exact_seconds = time.perf_counter() - start_time
+        exact_counts = getattr(summary, counter_name)
+        exact_top = [key for key, count in analyzation_helpers.get_top_k(exact_counts)]
+
+        for capacity in capacities:
+            start_time = time.perf_counter()
+            sketch = approximate_analysis(tweets_list, capacity)[2]
+            approximate_seconds = time.perf_counter() - start_time
+            top_list = sketch.top_k()
+            max_error = max(count - exact_counts[key] for key, count, error in top_list)
+            found = len({key for key, count, error in top_list} & set(exact_top))
+            results.append((statistic, capacity, exact_seconds, approximate_seconds, min(capacity, len(exact_counts)),
+                            len(exact_counts), found, max_error, sketch.error_bound()))
+
+    print("\nHeavy hitters report (" + str(num_tweets) + " tweets):")
+    print("statistic, capacity, exact seconds, approximate seconds, kept keys, distinct keys, top 10 found, "
+          "max count error, error bound")
+    for statistic, capacity, exact_seconds, approximate_seconds, kept, distinct, found, max_error, error_bound \
+            in results:
+        print(statistic, capacity, round(exact_seconds, 3), round(approximate_seconds, 3), kept, distinct, found,
+              max_error, round(error_bound, 1))
+    return results
+
+
+def main():
+    path_to_data = "../data/"
+    path_to_results = "../results/"
+    embeddings_file = path_to_data + "cc.de.100.500000.vec"
+    test_tweet_file = path_to_data + "filtered_test.json"
+
+    data_preprocessor = preprocessor.TweetPreprocessor(embeddings_file)
+
+    print("Benchmark: nlp.pipe batch sizes and number of processes")
+    benchmark_pipe_configurations(data_preprocessor, test_tweet_file,
+                                  [(1, 1), (64, 1), (256, 1), (1000, 1), (256, 2), (256, 4)])
+
+    best_model = torch.load(path_to_results + "best_model.pt")
+    with open(path_to_results + "Hyperparameter_NN.csv", mode="r", encoding="utf-8") as fin:
+        csv_reader = csv.reader(fin, delimiter=",")
+        next(csv_reader)
+        best_tweet_representation = next(csv_reader)[2]
+
+    print("\nBenchmark: parallel preprocessing with process pool")
+    benchmark_parallel_preprocessing(data_preprocessor, test_tweet_file, best_model, best_tweet_representation,
+                                     [1, 2, 4])
+
+    print("\nBenchmark: accuracy of quantized embedding tables")
+    compare_quantized_predictions(embeddings_file, test_tweet_file, best_model, best_tweet_representation)
+
+    print("\nBenchmark: columnar analysis of one million synthetic tweets")
+    benchmark_columnar_analysis()
+
+    print("\nBenchmark: approximate heavy hitters with bounded memory")
+    benchmark_heavy_hitters()
+
+
+if __name__ == "__main__":
+    main()
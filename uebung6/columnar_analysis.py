@@ -0,0 +1,132 @@
+import numpy as np
+import analyzation_helpers
+import time_buckets
+import tweet_io
+import tweet_summary
+
+
+class TweetTable():
+    """
+    Columnar alternative to the dict counters in analyzation_helpers: the tweets are held as NumPy columns
+    (users and hashtags as categorical codes in order of first occurrence, sentiments, timestamps as datetime64),
+    so the analyses become bincounts over these columns.
+    The methods return the same results as the corresponding functions in analyzation_helpers.
+    """
+
+    def __init__(self, users: list, user_codes: np.ndarray, sentiments: np.ndarray, timestamps: np.ndarray,
+                 hashtags: list, hashtag_codes: np.ndarray, hashtag_tweets: np.ndarray):
+        self.users = users  # user names, code i -> users[i]
+        self.user_codes = user_codes
+        self.sentiments = sentiments  # 0 = negative, 1 = neutral, 2 = positive
+        self.timestamps = timestamps  # local time of "created_at"
+        self.hashtags = hashtags  # hashtags, code i -> hashtags[i]
+        self.hashtag_codes = hashtag_codes  # one entry per hashtag occurrence ...
+        self.hashtag_tweets = hashtag_tweets  # ... and the tweet it occurs in
+
+    @classmethod
+    def from_tweets(cls, tweets, time_zone: str = None):
+        """
+        Builds the table from tweets (list or any iterable, e.g. tweet_io.iter_tweets) in one pass.
+        The dates are parsed at once, converted to time_zone if given (see time_buckets.parse_created_at).
+        """
+        user_index, hashtag_index = {}, {}
+        user_codes, sentiments, created_at = [], [], []
+        hashtag_codes, hashtag_tweets = [], []
+        for i, tweet in enumerate(tweets):
+            user_codes.append(user_index.setdefault(tweet["author_name"], len(user_index)))
+            sentiments.append(tweet_summary.sentiment_index(tweet["predicted-sentiment"]))
+            created_at.append(tweet["created_at"])
+            for hashtag in tweet["hashtags"]:
+                hashtag_codes.append(hashtag_index.setdefault(hashtag, len(hashtag_index)))
+                hashtag_tweets.append(i)
+
+        return cls(list(user_index), np.array(user_codes, dtype=np.int64), np.array(sentiments, dtype=np.int64),
+                   time_buckets.parse_created_at(created_at, time_zone), list(hashtag_index),
+                   np.array(hashtag_codes, dtype=np.int64), np.array(hashtag_tweets, dtype=np.int64))
+
+    @classmethod
+    def from_file(cls, infile_path: str, time_zone: str = None):
+        """
+        Reads the tweets of a preprocessed file one by one and builds the table.
+        """
+        return cls.from_tweets(tweet_io.iter_tweets(infile_path), time_zone)
+
+    def __len__(self) -> int:
+        return len(self.user_codes)
+
+    @staticmethod
+    def top10(names: list, counts: np.ndarray) -> list:
+        """
+        Returns the 10 (name, count) tuples with the highest counts like analyzation_helpers.get_top10 on a dict
+        filled in code order (ties go to the name that occurred first). Only the 10 candidates found by sorting
+        are handed to get_top10, so its output is the same.
+        """
+        candidates = np.lexsort((np.arange(len(counts)), -counts))[:10]
+        return analyzation_helpers.get_top10({names[code]: int(counts[code]) for code in np.sort(candidates)})
+
+    def most_active_users(self) -> (list, list):
+        """
+        Returns the 10 most active users with the sentiments of their tweets and with their tweets on each weekday
+        (see analyzation_helpers.analyze_most_active_users).
+        :return: (most_active_users_sentiments, most_active_users_tweet_days): tuple(list, list)
+        """
+        num_users = len(self.users)
+        users_frequency = np.bincount(self.user_codes, minlength=num_users)
+        users_sentiments = np.bincount(self.user_codes * 3 + self.sentiments, minlength=num_users * 3)\
+            .reshape(num_users, 3)
+        weekdays = time_buckets.weekdays(self.timestamps)
+        users_tweet_days = np.bincount(self.user_codes * 7 + weekdays, minlength=num_users * 7).reshape(num_users, 7)
+
+        print("Top 10 most active users:")
+        most_active_users = self.top10(self.users, users_frequency)
+        user_codes = {user: code for code, user in enumerate(self.users)}
+        most_active_users_sentiments = [(user, users_sentiments[user_codes[user]].tolist())
+                                        for user, frequency in most_active_users]
+        most_active_users_tweet_days = [(user, users_tweet_days[user_codes[user]].tolist())
+                                        for user, frequency in most_active_users]
+        return most_active_users_sentiments, most_active_users_tweet_days
+
+    def most_frequent_hashtags(self) -> (list, list):
+        """
+        Returns the 10 most frequent hashtags with their frequency and with the sentiments of their tweets
+        (see analyzation_helpers.analyze_most_frequent_hashtags).
+        :return: (most_frequent_hashtags, most_frequent_hashtags_sentiments): tuple(list, list)
+        """
+        num_hashtags = len(self.hashtags)
+        hashtags_frequency = np.bincount(self.hashtag_codes, minlength=num_hashtags)
+        hashtags_sentiments = np.bincount(self.hashtag_codes * 3 + self.sentiments[self.hashtag_tweets],
+                                          minlength=num_hashtags * 3).reshape(num_hashtags, 3)
+
+        print("\nMost frequent hashtags in tweet list:")
+        most_frequent_hashtags = self.top10(self.hashtags, hashtags_frequency)
+        hashtag_codes = {hashtag: code for code, hashtag in enumerate(self.hashtags)}
+        most_frequent_hashtags_sentiments = [(hashtag, hashtags_sentiments[hashtag_codes[hashtag]].tolist())
+                                             for hashtag, frequency in most_frequent_hashtags]
+        return most_frequent_hashtags, most_frequent_hashtags_sentiments
+
+    def daily_hourly_frequency(self) -> (dict, dict):
+        """
+        Returns the average number of tweets on each weekday and in each of the 168 hours of a week
+        (see analyzation_helpers.get_tweet_daily_hourly_frequency), averaged over the days that have tweets.
+        Weekdays without any tweet have average 0.
+        :return: (weekday_tweet_avg, hour_tweet_avg): tuple(dict, dict)
+        """
+        return self.weekly_frequency(np.timedelta64(1, "D")), self.weekly_frequency(np.timedelta64(1, "h"))
+
+    def weekly_frequency(self, bin_width=np.timedelta64(1, "h")) -> dict:
+        """
+        Returns the average number of tweets in each bin of bin_width (e.g. 15 minutes, 1 hour, 1 day)
+        of a week starting on Monday (see time_buckets.week_bin_averages).
+        :param bin_width: np.timedelta64
+        :return: bin_averages: dict
+        """
+        return time_buckets.week_bin_averages(self.timestamps, bin_width)
+
+    def timeline(self, bin_width=np.timedelta64(1, "D")) -> (np.ndarray, np.ndarray):
+        """
+        Returns number of tweets in consecutive buckets of bin_width as (bucket_starts, counts)
+        (see time_buckets.bucket_counts).
+        :param bin_width: np.timedelta64
+        :return: (bucket_starts, counts): tuple(np.ndarray, np.ndarray)
+        """
+        return time_buckets.bucket_counts(self.timestamps, bin_width)
@@ -0,0 +1,323 @@
+import hashlib
+import io
+import os
+import numpy as np
+
+
+def store_path_for(vec_path: str) -> str:
+    """
+    Returns the path prefix of the binary store belonging to a fastText .vec file.
+    "../data/cc.de.100.500000.vec" -> "../data/cc.de.100.500000"
+    :param vec_path: str
+    :return: store_path: str
+    """
+    root, extension = os.path.splitext(vec_path)
+    if extension == ".vec":
+        return root
+    return vec_path
+
+
+def store_exists(store_path: str) -> bool:
+    """
+    Checks if matrix (.npy) and word list (.vocab) of a binary store exist.
+    :param store_path: str
+    :return: bool
+    """
+    return os.path.isfile(store_path + ".npy") and os.path.isfile(store_path + ".vocab")
+
+
+def convert_vec_file(vec_path: str, store_path: str) -> None:
+    """
+    One-time conversion of a fastText .vec file into a binary store:
+    - <store_path>.npy: float32 matrix with one row per word
+    - <store_path>.vocab: the words, one per line, line number = row in matrix
+    Both files are written to temporary files first and renamed afterwards,
+    so a crashed conversion never leaves a half written store behind.
+    :param vec_path: str
+    :param store_path: str
+    :return: None
+    """
+    print("Converting", vec_path, "to binary embedding store (only done once)...")
+    matrix_tmp_path = store_path + ".npy.tmp"
+    vocab_tmp_path = store_path + ".vocab.tmp"
+
+    with io.open(vec_path, 'r', encoding='utf-8', newline='\n', errors='ignore') as fin:
+        n, d = map(int, fin.readline().split())
+        matrix = np.lib.format.open_memmap(matrix_tmp_path, mode="w+", dtype=np.float32, shape=(n, d))
+        words = []
+        for line in fin:
+            if len(words) == n:
+                break
+            tokens = line.rstrip().split(' ')
+            matrix[len(words)] = np.asarray(tokens[1:], dtype=np.float32)
+            words.append(tokens[0])
+        matrix.flush()
+        del matrix
+
+    if len(words) < n:
+        # header announced more vectors than the file holds -> shrink matrix to the rows actually read
+        full_matrix = np.load(matrix_tmp_path, mmap_mode="r")
+        np.save(matrix_tmp_path + ".npy", full_matrix[:len(words)])
+        del full_matrix
+        os.replace(matrix_tmp_path + ".npy", matrix_tmp_path)
+
+    with io.open(vocab_tmp_path, 'w', encoding='utf-8', newline='') as fout:
+        fout.write("\n".join(words))
+
+    os.replace(vocab_tmp_path, store_path + ".vocab")
+    os.replace(matrix_tmp_path, store_path + ".npy")
+    print("Wrote: ", store_path + ".npy", store_path + ".vocab")
+
+
+def load_word_index(vocab_path: str) -> dict:
+    """
+    Reads the word list of a binary store and returns dictionary word -> row.
+    If a word occurs several times, the last row wins (like the old dictionary based loading).
+    :param vocab_path: str
+    :return: word_index: dict
+    """
+    with io.open(vocab_path, 'r', encoding='utf-8', newline='') as fin:
+        content = fin.read()
+    words = content.split("\n") if content else []
+    return dict(zip(words, range(len(words))))
+
+
+def write_store(store_path: str, words: list, matrix: np.ndarray) -> None:
+    """
+    Writes words and matrix as binary store (<store_path>.npy and <store_path>.vocab) via temporary files.
+    :param store_path: str
+    :param words: list
+    :param matrix: np.ndarray
+    :return: None
+    """
+    with io.open(store_path + ".vocab.tmp", 'w', encoding='utf-8', newline='') as fout:
+        fout.write("\n".join(words))
+    np.save(store_path + ".tmp.npy", matrix)
+    os.replace(store_path + ".vocab.tmp", store_path + ".vocab")
+    os.replace(store_path + ".tmp.npy", store_path + ".npy")
+
+
+def pruned_store_path(store_path: str, source_paths: list) -> str:
+    """
+    Returns path prefix of a pruned store. The name contains a hash of path, size and modification time of
+    every source file (full embeddings and datasets), so changed files get a new pruned store.
+    :param store_path: str
+    :param source_paths: list
+    :return: pruned_store_path: str
+    """
+    sources_hash = hashlib.sha1()
+    for source_path in source_paths:
+        sources_hash.update(("%s\0%d\0%d\0" % (os.path.abspath(source_path), os.path.getsize(source_path),
+                                                os.path.getmtime(source_path))).encode("utf-8"))
+    return store_path + ".pruned-" + sources_hash.hexdigest()[:16]
+
+
+def prune_vec_file(vec_path: str, words: set, pruned_path: str) -> None:
+    """
+    Reads only the vectors of the given words out of a .vec file and saves them as (small) binary store.
+    All other lines are skipped without parsing their numbers.
+    :param vec_path: str
+    :param words: set
+    :param pruned_path: str
+    :return: None
+    """
+    vectors = {}
+    with io.open(vec_path, 'r', encoding='utf-8', newline='\n', errors='ignore') as fin:
+        n, d = map(int, fin.readline().split())
+        for line in fin:
+            word = line[:line.find(' ')]
+            if word in words:
+                vectors[word] = np.asarray(line.rstrip().split(' ')[1:], dtype=np.float32)
+    matrix = np.stack(list(vectors.values())) if vectors else np.empty((0, d), dtype=np.float32)
+    write_store(pruned_path, list(vectors), matrix)
+
+
+def quantize_store(store_path: str, dtype: str) -> None:
+    """
+    Creates a quantized copy of the float32 matrix of a binary store (the word list is shared):
+    - "float16": <store_path>.f16.npy
+    - "int8": <store_path>.q8.npy with int8 rows and <store_path>.q8scale.npy with one float32 scale per row
+      (row = int8 row * scale, scale = max absolute value of the row / 127)
+    :param store_path: str
+    :param dtype: str
+    :return: None
+    """
+    matrix = np.load(store_path + ".npy", mmap_mode="r")
+    if dtype == "float16":
+        np.save(store_path + ".f16.tmp.npy", matrix.astype(np.float16))
+        os.replace(store_path + ".f16.tmp.npy", store_path + ".f16.npy")
+    elif dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1  # rows of zeros
+        quantized = np.rint(matrix / scales[:, None]).astype(np.int8)
+        np.save(store_path + ".q8scale.tmp.npy", scales.astype(np.float32))
+        np.save(store_path + ".q8.tmp.npy", quantized)
+        os.replace(store_path + ".q8scale.tmp.npy", store_path + ".q8scale.npy")
+        os.replace(store_path + ".q8.tmp.npy", store_path + ".q8.npy")
+    else:
+        raise ValueError("Unknown embedding dtype: " + dtype)
+    print("Wrote: ", dtype, "quantized embeddings of", store_path)
+
+
+# matrix file of each supported embedding dtype
+MATRIX_SUFFIXES = {"float32": ".npy", "float16": ".f16.npy", "int8": ".q8.npy"}
+
+
+class EmbeddingStore():
+    """
+    fastText embeddings as memory-mapped matrix plus dictionary word -> row.
+    The matrix is opened read-only via mmap, so the operating system loads only the pages
+    that are used and shares them between all processes working with the same store.
+    dtype selects the table: "float32" (4 bytes per value), "float16" (2 bytes) or
+    "int8" (1 byte plus one float32 scale per row). Quantized tables are created from the float32 table
+    on first use and dequantized on the fly when rows are pooled.
+    """
+
+    def __init__(self, store_path: str, dtype: str = "float32"):
+        self.store_path = store_path
+        self.dtype = dtype
+        if dtype not in MATRIX_SUFFIXES:
+            raise ValueError("Unknown embedding dtype: " + dtype)
+        if not os.path.isfile(store_path + MATRIX_SUFFIXES[dtype]):
+            quantize_store(store_path, dtype)
+        self.matrix = np.load(store_path + MATRIX_SUFFIXES[dtype], mmap_mode="r")
+        self.scales = np.load(store_path + ".q8scale.npy", mmap_mode="r") if dtype == "int8" else None
+        self.word_index = load_word_index(store_path + ".vocab")
+        self.vocab, self.vecsize = self.matrix.shape
+
+    def nbytes(self) -> int:
+        """
+        Returns size of the embedding table (matrix and scales) in bytes.
+        :return: nbytes: int
+        """
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def from_vec_file(cls, vec_path: str, dtype: str = "float32"):
+        """
+        Opens the binary store of a .vec file and creates it first if it doesn't exist
+        or is older than the .vec file.
+        :param vec_path: str
+        :param dtype: str
+        :return: EmbeddingStore
+        """
+        store_path = store_path_for(vec_path)
+        if not store_exists(store_path) or \
+                (os.path.isfile(vec_path) and os.path.getmtime(vec_path) > os.path.getmtime(store_path + ".npy")):
+            convert_vec_file(vec_path, store_path)
+            for quantized_suffix in (".f16.npy", ".q8.npy", ".q8scale.npy"):  # outdated quantized tables
+                if os.path.isfile(store_path + quantized_suffix):
+                    os.remove(store_path + quantized_suffix)
+        return cls(store_path, dtype)
+
+    def prune(self, words: set, pruned_path: str) -> None:
+        """
+        Saves the vectors of the given words (only those in the store) as new, small binary store.
+        :param words: set
+        :param pruned_path: str
+        :return: None
+        """
+        kept_words = [word for word in self.word_index if word in words]
+        rows = np.fromiter((self.word_index[word] for word in kept_words), dtype=np.int64, count=len(kept_words))
+        write_store(pruned_path, kept_words, self.rows(rows))
+
+    @classmethod
+    def for_datasets(cls, vec_path: str, dataset_paths: list, collect_vocabulary, dtype: str = "float32"):
+        """
+        Opens a store that only holds the vectors of words occurring in the given datasets.
+        collect_vocabulary(dataset_paths) has to return the set of all tokens of the datasets; it is only called
+        if no pruned store for these datasets exists yet. The rows are taken from the binary store
+        if it was already created, otherwise directly from the .vec file.
+        :param vec_path: str
+        :param dataset_paths: list
+        :param collect_vocabulary: function
+        :param dtype: str
+        :return: EmbeddingStore
+        """
+        store_path = store_path_for(vec_path)
+        full_store_exists = store_exists(store_path)
+        source_path = store_path + ".npy" if full_store_exists else vec_path
+        pruned_path = pruned_store_path(store_path, [source_path] + list(dataset_paths))
+        if not store_exists(pruned_path):
+            words = collect_vocabulary(dataset_paths)
+            print("Pruning embeddings to the", len(words), "token types of", dataset_paths)
+            if full_store_exists:
+                cls(store_path).prune(words, pruned_path)
+            else:
+                prune_vec_file(vec_path, words, pruned_path)
+            print("Wrote: ", pruned_path + ".npy", pruned_path + ".vocab")
+        return cls(pruned_path, dtype)
+
+    def lookup(self, words) -> np.ndarray:
+        """
+        Returns the rows of all words which have a fastText vector (unknown words are ignored).
+        :param words: iterable of str
+        :return: indices: np.ndarray
+        """
+        word_index = self.word_index
+        return np.fromiter((row for row in map(word_index.get, words) if row is not None), dtype=np.int64)
+
+    def rows(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns the given rows as float32 matrix (gathered by one fancy-indexing operation, dequantized if needed).
+        :param indices: np.ndarray
+        :return: vectors: np.ndarray
+        """
+        vectors = self.matrix[indices].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[indices, None]
+        return vectors
+
+    def pool(self, indices: np.ndarray, tweet_representation: str) -> np.ndarray:
+        """
+        Returns tweet vector for given rows: "tweetmin", "tweetmax" or (default) "tweetavg".
+        Rows are gathered by one fancy-indexing operation and reduced along the token axis.
+        :param indices: np.ndarray
+        :param tweet_representation: str
+        :return: vector: np.ndarray
+        """
+        vectors = self.rows(indices)
+        if tweet_representation == "tweetmin":
+            return vectors.min(axis=0)
+        elif tweet_representation == "tweetmax":
+            return vectors.max(axis=0)
+        else:
+            return vectors.mean(axis=0)
+
+    def pool_ragged(self, indices: np.ndarray, offsets: np.ndarray) -> (np.ndarray, dict):
+        """
+        Pools many tweets at once. indices holds the rows of all tweets' tokens one after another,
+        the tokens of tweet i are indices[offsets[i]:offsets[i + 1]] (len(offsets) = number of tweets + 1).
+        All rows are gathered at once and reduced per tweet with segmented reductions (ufunc.reduceat).
+        Tweets without tokens get no vectors (they are dropped like in the single tweet methods):
+        returns (has_tokens, vectors) with boolean mask has_tokens over all tweets and dictionary
+        {"tweetmax", "tweetmin", "tweetavg"} of matrices with one row per tweet with tokens.
+        :param indices: np.ndarray
+        :param offsets: np.ndarray
+        :return: (has_tokens, vectors): tuple(np.ndarray, dict)
+        """
+        lengths = np.diff(offsets)
+        has_tokens = lengths > 0
+        if not indices.size:
+            empty = np.empty((0, self.vecsize), dtype=np.float32)
+            return has_tokens, {"tweetmax": empty, "tweetmin": empty, "tweetavg": empty}
+        # without empty tweets every segment ends where the next one starts
+        starts = offsets[:-1][has_tokens]
+        vectors = self.rows(indices)
+        sums = np.add.reduceat(vectors, starts, axis=0, dtype=np.float64)
+        return has_tokens, {"tweetmax": np.maximum.reduceat(vectors, starts, axis=0),
+                            "tweetmin": np.minimum.reduceat(vectors, starts, axis=0),
+                            "tweetavg": (sums / lengths[has_tokens, None]).astype(np.float32)}
+
+
+def ragged_offsets(index_arrays: list) -> (np.ndarray, np.ndarray):
+    """
+    Concatenates the row indices of several tweets into one flat array and returns it with the tweet offsets
+    (input of EmbeddingStore.pool_ragged).
+    :param index_arrays: list of np.ndarray
+    :return: (indices, offsets): tuple(np.ndarray, np.ndarray)
+    """
+    offsets = np.zeros(len(index_arrays) + 1, dtype=np.int64)
+    np.cumsum([len(tweet_indices) for tweet_indices in index_arrays], out=offsets[1:])
+    indices = np.concatenate(index_arrays) if index_arrays else np.empty(0, dtype=np.int64)
+    return indices.astype(np.int64, copy=False), offsets
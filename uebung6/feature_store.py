@@ -0,0 +1,128 @@
+import os
+import struct
+import numpy as np
+
+# order of the vectors in a row of a feature sidecar, also used for the rows of tweet_cache.TweetCache
+TWEET_REPRESENTATIONS = ("tweetmax", "tweetmin", "tweetavg")
+
+COUNT_WIDTH = 20  # characters reserved for the number of rows in the .npy header, so it can be rewritten in place
+
+
+def features_path(json_path: str) -> str:
+    """
+    Returns path of the binary feature sidecar of a preprocessed json file.
+    :param json_path: str
+    :return: features_path: str
+    """
+    return json_path + ".features.npy"
+
+
+def _npy_header(num_rows: int, row_shape: tuple, dtype: np.dtype) -> bytes:
+    """
+    Returns .npy (version 1.0) header for an array of num_rows rows. The row count is padded to COUNT_WIDTH
+    characters, so headers of the same file always have the same length.
+    """
+    shape = "(" + str(num_rows).ljust(COUNT_WIDTH) + ", " + ", ".join(str(size) for size in row_shape) + ")"
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %s, }" % (np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                                       shape)
+    # magic string (6) + version (2) + header length (2) + header + padding, total length multiple of 64
+    header_length = len(header) + 1
+    header_length += (64 - (10 + header_length) % 64) % 64
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", header_length) + \
+        header.ljust(header_length - 1).encode("latin1") + b"\n"
+
+
+class NpyAppender():
+    """
+    Appends rows of shape row_shape (() for one value per row) and given dtype to a .npy file
+    that can be memory-mapped with np.load(path, mmap_mode="r").
+    The row count in the header is updated when the appender is closed (or a checkpoint is taken).
+    If resume_rows is given, the file is cut back to that number of rows and continued.
+    """
+
+    def __init__(self, path: str, row_shape: tuple, dtype, resume_rows: int = None):
+        self.path = path
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.header_size = len(_npy_header(0, self.row_shape, self.dtype))
+        self.row_bytes = int(np.prod(self.row_shape)) * self.dtype.itemsize
+        if resume_rows is not None:
+            self.num_rows = resume_rows
+            self.fout = open(path, mode="r+b")
+            self.fout.truncate(self.header_size + resume_rows * self.row_bytes)
+            self.fout.seek(0, os.SEEK_END)
+        else:
+            self.num_rows = 0
+            self.fout = open(path, mode="wb")
+            self.fout.write(_npy_header(0, self.row_shape, self.dtype))
+
+    def append(self, rows: np.ndarray) -> int:
+        """
+        Appends rows (shape: number of rows x row_shape) and returns the row of the first one.
+        :param rows: np.ndarray
+        :return: first_row: int
+        """
+        self.fout.write(np.ascontiguousarray(rows, dtype=self.dtype).tobytes())
+        first_row = self.num_rows
+        self.num_rows += len(rows)
+        return first_row
+
+    def checkpoint(self) -> int:
+        """
+        Updates the header, flushes all rows to disk and returns the number of rows.
+        :return: num_rows: int
+        """
+        self._write_header()
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+        return self.num_rows
+
+    def _write_header(self) -> None:
+        position = self.fout.tell()
+        self.fout.seek(0)
+        self.fout.write(_npy_header(self.num_rows, self.row_shape, self.dtype))
+        self.fout.seek(position)
+
+    def close(self) -> None:
+        """
+        Writes the final row count into the header and closes the file.
+        :return: None
+        """
+        self._write_header()
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FeatureWriter(NpyAppender):
+    """
+    Appends tweet vectors row by row to a feature sidecar (see NpyAppender).
+    Each row holds the tweetmax, tweetmin and tweetavg vectors of one tweet (shape: 3 x vector size).
+    Rows that are already in this layout (e.g. rows of another feature file) can be added with append().
+    """
+
+    def __init__(self, path: str, vecsize: int, dtype=np.float32, resume_rows: int = None):
+        super().__init__(path, (len(TWEET_REPRESENTATIONS), vecsize), dtype, resume_rows)
+
+    def write_rows(self, vectors: dict) -> int:
+        """
+        Appends the vectors of several tweets given as matrices {"tweetmax", "tweetmin", "tweetavg"}
+        (one row per tweet) and returns the row of the first tweet.
+        :param vectors: dict
+        :return: first_row: int
+        """
+        return self.append(np.stack([vectors[representation] for representation in TWEET_REPRESENTATIONS], axis=1))
+
+
+def load_features(json_path: str) -> np.ndarray:
+    """
+    Memory-maps the feature sidecar of a preprocessed json file (no copy, pages are read on access).
+    Row "features-row" of a tweet holds its tweetmax, tweetmin and tweetavg vectors (in this order).
+    :param json_path: str
+    :return: features: np.ndarray
+    """
+    return np.load(features_path(json_path), mmap_mode="r")
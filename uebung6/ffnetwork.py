@@ -1,6 +1,10 @@
+import hashlib
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.types
+import feature_store
+import tweet_io
 
 
 class FeedForwardNetwork(nn.Module):
@@ -46,6 +50,31 @@ class FeedForwardNetwork(nn.Module):
         return out
 
 
+class TweetFeatureDataset(torch.utils.data.Dataset):
+    """
+    Dataset of tweets preprocessed by TweetPreprocessor.convert_dataset for train_nn and eval_nn.
+    The tweet vectors of the chosen representation are read from the memory-mapped feature sidecar
+    (see feature_store.py), the labels from "annotation" in the json file.
+    """
+
+    def __init__(self, json_path: str, tweet_representation: str) -> None:
+        self.features = feature_store.load_features(json_path)
+        self.representation_index = feature_store.TWEET_REPRESENTATIONS.index(tweet_representation)
+        rows, labels = [], []
+        for tweet in tweet_io.iter_tweets(json_path):
+            rows.append(tweet["features-row"])
+            labels.append(tweet["annotation"])
+        self.rows = np.array(rows, dtype=np.int64)
+        self.labels = torch.tensor(labels)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int):
+        vector = np.array(self.features[self.rows[index], self.representation_index])
+        return torch.from_numpy(vector), self.labels[index]
+
+
 def train_eval_nn(model: FeedForwardNetwork, train_loader: torch.utils.data.DataLoader,
                   dev_loader: torch.utils.data.DataLoader, \
                   test_loader: torch.utils.data.DataLoader, epochs: int, loss_function: str, optimizer, device: str,
@@ -149,3 +178,32 @@ def eval_nn(model: FeedForwardNetwork, data_loader: torch.utils.data.DataLoader)
     accuracy = 100 * correct / total
     print('Accuracy of the network on the test set: %d %%' % accuracy)
     return goldlabcount, predlabcount, trueposcount, precision, recall, f1score, accuracy
+
+
+def predict_nn(model: FeedForwardNetwork, features, batch_size: int = 4096, device: str = "cpu"):
+    """
+    Predicts the classes (0 = negative, 1 = neutral, 2 = positive) for all rows of the feature matrix.
+    The rows are classified in batches of batch_size under torch.inference_mode.
+    Returns numpy array with one predicted class per row.
+    """
+    model.to(device)
+    # set dropout and batch normalization layers to evaluation mode
+    model.eval()
+    features = torch.as_tensor(features, dtype=torch.float32)
+    predictions = torch.empty(len(features), dtype=torch.int64)
+    with torch.inference_mode():
+        for start in range(0, len(features), batch_size):
+            batch = features[start:start + batch_size].to(device)
+            predictions[start:start + batch_size] = torch.argmax(model(batch), 1).cpu()
+    return predictions.numpy()
+
+
+def model_fingerprint(model: FeedForwardNetwork) -> str:
+    """
+    Returns hash of the model's architecture and weights, used to recognize results of the same model.
+    """
+    fingerprint = hashlib.sha1(repr(model).encode("utf-8"))
+    for name, tensor in model.state_dict().items():
+        fingerprint.update(name.encode("utf-8"))
+        fingerprint.update(tensor.detach().cpu().numpy().tobytes())
+    return fingerprint.hexdigest()
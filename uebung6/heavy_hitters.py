@@ -0,0 +1,129 @@
+import itertools
+import analyzation_helpers
+import time_buckets
+import tweet_summary
+
+
+class SpaceSaving():
+    """
+    Approximate counter of the most frequent keys (Space-Saving algorithm) that keeps at most capacity keys,
+    however many different keys occur. Each kept key also counts breakdowns (e.g. sentiments, weekdays)
+    of breakdown_sizes positions each.
+    Error bounds after N added items:
+    - estimated count - error <= true count <= estimated count, and error <= N / capacity for every kept key
+    - every key with a true count > N / capacity is kept
+    - breakdowns are counted only while a key is kept, so they can miss up to error items of the key.
+    """
+
+    def __init__(self, capacity: int, breakdown_sizes=()):
+        self.capacity = capacity
+        self.breakdown_sizes = tuple(breakdown_sizes)
+        self.num_items = 0
+        self.counts = {}  # key -> estimated count
+        self.errors = {}  # key -> maximal overestimation of its count
+        self.breakdowns = {}  # key -> one list of counts per breakdown
+        self.buckets = {}  # count -> keys with this count (dict used as ordered set, oldest first)
+        self.min_count = 0
+
+    def _remove_from_bucket(self, key, count: int) -> None:
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if count == self.min_count:
+                self.min_count = count + 1  # the key moves on to count + 1, so that bucket isn't empty
+
+    def add(self, key, *breakdown_positions) -> None:
+        """
+        Counts one occurrence of key, and for each breakdown the given position (e.g. sentiment, weekday).
+        If capacity keys are kept already, a new key replaces the key with the smallest count
+        and takes over its count as error.
+        """
+        self.num_items += 1
+        count = self.counts.get(key)
+        if count is None:
+            if len(self.counts) < self.capacity:
+                count = 0
+                self.errors[key] = 0
+            else:
+                count = self.min_count
+                evicted_key = next(iter(self.buckets[count]))
+                self._remove_from_bucket(evicted_key, count)
+                del self.counts[evicted_key], self.errors[evicted_key], self.breakdowns[evicted_key]
+                self.errors[key] = count
+            self.breakdowns[key] = [[0] * size for size in self.breakdown_sizes]
+        else:
+            self._remove_from_bucket(key, count)
+
+        count += 1
+        self.counts[key] = count
+        self.buckets.setdefault(count, {})[key] = None
+        if count == 1:
+            self.min_count = 1
+        for breakdown, position in zip(self.breakdowns[key], breakdown_positions):
+            breakdown[position] += 1
+
+    def error_bound(self) -> float:
+        """
+        Returns the guaranteed bound N / capacity of the overestimation of any count.
+        :return: error_bound: float
+        """
+        return self.num_items / self.capacity
+
+    def top_k(self, k: int = 10) -> list:
+        """
+        Returns the k keys with the highest estimated counts as (key, count, error) tuples, highest first
+        (ties in order of insertion, see analyzation_helpers.get_top_k).
+        :param k: int
+        :return: top_list: list
+        """
+        return [(key, count, self.errors[key]) for key, count in analyzation_helpers.get_top_k(self.counts, k)]
+
+
+def approximate_most_frequent_hashtags(tweets, capacity: int = 10000, k: int = 10) -> (list, list, SpaceSaving):
+    """
+    Approximate version of analyzation_helpers.analyze_most_frequent_hashtags with at most capacity hashtags
+    in memory (see SpaceSaving). tweets can be any iterable (e.g. tweet_io.iter_tweets).
+    Returns (most_frequent_hashtags, most_frequent_hashtags_sentiments, hashtags): the counts are estimates
+    at most hashtags.error_bound() higher than the true counts, hashtags (SpaceSaving) has the errors of each.
+    :param tweets: iterable of dict
+    :param capacity: int
+    :param k: int
+    :return: (most_frequent_hashtags, most_frequent_hashtags_sentiments, hashtags): tuple(list, list, SpaceSaving)
+    """
+    hashtags = SpaceSaving(capacity, breakdown_sizes=(3,))
+    for tweet in tweets:
+        sentiment = tweet_summary.sentiment_index(tweet["predicted-sentiment"])
+        for hashtag in tweet["hashtags"]:
+            hashtags.add(hashtag, sentiment)
+
+    top_hashtags = hashtags.top_k(k)
+    most_frequent_hashtags = [(hashtag, count) for hashtag, count, error in top_hashtags]
+    most_frequent_hashtags_sentiments = [(hashtag, hashtags.breakdowns[hashtag][0])
+                                         for hashtag, count, error in top_hashtags]
+    return most_frequent_hashtags, most_frequent_hashtags_sentiments, hashtags
+
+
+def approximate_most_active_users(tweets, capacity: int = 10000, k: int = 10) -> (list, list, SpaceSaving):
+    """
+    Approximate version of analyzation_helpers.analyze_most_active_users with at most capacity users
+    in memory (see SpaceSaving). tweets can be any iterable (e.g. tweet_io.iter_tweets).
+    Returns (most_active_users_sentiments, most_active_users_tweet_days, users): users (SpaceSaving) has the
+    estimated numbers of tweets, at most users.error_bound() higher than the true numbers, and their errors.
+    :param tweets: iterable of dict
+    :param capacity: int
+    :param k: int
+    :return: (most_active_users_sentiments, most_active_users_tweet_days, users): tuple(list, list, SpaceSaving)
+    """
+    users = SpaceSaving(capacity, breakdown_sizes=(3, 7))
+    tweets = iter(tweets)
+    for chunk in iter(lambda: list(itertools.islice(tweets, tweet_summary.CHUNK_SIZE)), []):
+        # the dates of a chunk are parsed at once, Monday = 0 -> Sunday = 6
+        chunk_weekdays = time_buckets.weekdays(time_buckets.parse_created_at(tweet["created_at"] for tweet in chunk))
+        for tweet, weekday in zip(chunk, chunk_weekdays.tolist()):
+            users.add(tweet["author_name"], tweet_summary.sentiment_index(tweet["predicted-sentiment"]), weekday)
+
+    top_users = users.top_k(k)
+    most_active_users_sentiments = [(user, users.breakdowns[user][0]) for user, count, error in top_users]
+    most_active_users_tweet_days = [(user, users.breakdowns[user][1]) for user, count, error in top_users]
+    return most_active_users_sentiments, most_active_users_tweet_days, users
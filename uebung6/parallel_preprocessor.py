@@ -0,0 +1,150 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import torch
+import feature_store
+import ffnetwork
+import preprocessor
+import token_columns
+import tweet_io
+
+# set in the parent before the worker processes are forked -> inherited copy-on-write by all workers
+_worker_preprocessor = None
+_worker_model = None
+
+
+def _init_worker(preprocessor_args: tuple, model: ffnetwork.FeedForwardNetwork) -> None:
+    """
+    Initializes a worker process. Forked workers already hold the parent's preprocessor and model,
+    spawned workers (platforms without fork) create their own preprocessor, which maps the same embedding store.
+    """
+    global _worker_preprocessor, _worker_model
+    if _worker_preprocessor is None:
+        _worker_preprocessor = preprocessor.TweetPreprocessor(*preprocessor_args)
+    if _worker_model is None:
+        _worker_model = model
+    torch.set_num_threads(1)  # parallelism comes from the processes
+
+
+def _process_shard(shard_number: int, tweets: list, shard_dir: str, tweet_representation: str,
+                   cache_path: str, batch_size: int, token_fields: tuple, columnar_tokens: bool) -> str:
+    """
+    Preprocesses one shard of tweets in a worker process and returns the path of its JSON Lines output.
+    """
+    shard_infile_path = os.path.join(shard_dir, "shard_%06d.in.jsonl" % shard_number)
+    shard_outfile_path = os.path.join(shard_dir, "shard_%06d.out.jsonl" % shard_number)
+    with tweet_io.TweetWriter(shard_infile_path) as writer:
+        for tweet in tweets:
+            writer.write(tweet)
+    _worker_preprocessor.preprocess_with_prediction(shard_infile_path, shard_outfile_path, _worker_model,
+                                                    tweet_representation, batch_size=batch_size, resume=False,
+                                                    cache_path=cache_path, token_fields=token_fields,
+                                                    columnar_tokens=columnar_tokens)
+    os.remove(shard_infile_path)
+    return shard_outfile_path
+
+
+def _merge_shard(shard_outfile_path: str, writer: tweet_io.TweetWriter, feature_writer: feature_store.FeatureWriter,
+                 token_writer: token_columns.TokenColumnsWriter = None) -> None:
+    """
+    Appends the tweets, feature rows and token columns (if token_writer is given) of a finished shard
+    to the merged outfile and deletes the shard's files.
+    """
+    shard_features_path = feature_store.features_path(shard_outfile_path)
+    first_row = feature_writer.append(feature_store.load_features(shard_outfile_path))
+    first_token_row = None
+    if token_writer is not None:
+        first_token_row = token_writer.append_columns(token_columns.TokenColumns(shard_outfile_path))
+    for tweet in tweet_io.iter_tweets(shard_outfile_path):
+        tweet["features-row"] += first_row
+        if first_token_row is not None:
+            tweet["tokens-row"] += first_token_row
+        writer.write(tweet)
+    os.remove(shard_outfile_path)
+    os.remove(shard_features_path)
+    if token_writer is not None:
+        for path in token_columns.token_columns_paths(shard_outfile_path).values():
+            os.remove(path)
+
+
+def preprocess_parallel(data_preprocessor: preprocessor.TweetPreprocessor, infile_path: str, outfile_path: str,
+                        model: ffnetwork.FeedForwardNetwork, tweet_representation: str, n_workers: int = None,
+                        shard_size: int = 10000, cache_path: str = None, batch_size: int = 256,
+                        token_fields=preprocessor.TOKEN_FIELDS, columnar_tokens: bool = False) -> None:
+    """
+    Parallel version of TweetPreprocessor.preprocess_with_prediction:
+    Splits the tweets of infile_path into shards of shard_size tweets and preprocesses them in n_workers processes
+    (default: number of cores). Workers are forked from this process, so they share the memory-mapped embeddings,
+    the loaded spacy pipeline and the model instead of loading them again.
+    The shard outputs (and their feature and token sidecars) are merged in input order,
+    so the outfile is the same as with the serial method and the same batch_size, token_fields and columnar_tokens.
+    Workers share the cache file (see tweet_cache.TweetCache).
+    At most 2 * n_workers shards are in flight, so memory use doesn't depend on the size of the input.
+    :param data_preprocessor: preprocessor.TweetPreprocessor
+    :param infile_path: str
+    :param outfile_path: str
+    :param model: ffnetwork.FeedForwardNetwork
+    :param tweet_representation: str
+    :param n_workers: int
+    :param shard_size: int
+    :param cache_path: str
+    :param batch_size: int
+    :param token_fields: iterable of str
+    :param columnar_tokens: bool
+    :return: None
+    """
+    global _worker_preprocessor, _worker_model
+    n_workers = n_workers or os.cpu_count()
+    token_fields = tuple(token_fields)
+    start_time = time.perf_counter()
+
+    model.to("cpu")
+    model.eval()
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        data_preprocessor.pipeline(fields=token_fields)  # load spacy before forking, so workers share it
+        _worker_preprocessor, _worker_model = data_preprocessor, model
+    else:
+        context = multiprocessing.get_context("spawn")
+        model.share_memory()
+
+    shard_dir = tempfile.mkdtemp(prefix="shards_", dir=os.path.dirname(os.path.abspath(outfile_path)))
+    tweets = tweet_io.iter_tweets(infile_path)
+    shards = iter(lambda: list(itertools.islice(tweets, shard_size)), [])
+    num_shards = 0
+    token_writer = None
+    try:
+        if columnar_tokens:
+            token_writer = token_columns.TokenColumnsWriter(outfile_path + ".part", token_fields)
+        with context.Pool(n_workers, initializer=_init_worker,
+                          initargs=((data_preprocessor.embeddings_path, data_preprocessor.vocabulary_paths,
+                                     data_preprocessor.embedding_dtype), model)) as pool, \
+                tweet_io.TweetWriter(outfile_path + ".part") as writer, \
+                feature_store.FeatureWriter(feature_store.features_path(outfile_path + ".part"),
+                                            data_preprocessor.vecsize) as feature_writer:
+            pending = collections.deque()  # results of submitted shards in input order
+            for shard_number, shard in enumerate(itertools.chain(shards, [None])):
+                if shard is not None:
+                    pending.append(pool.apply_async(_process_shard, (shard_number, shard, shard_dir,
+                                                                     tweet_representation, cache_path, batch_size,
+                                                                     token_fields, columnar_tokens)))
+                    num_shards += 1
+                # merge finished shards in order, wait if too many shards are in flight (or input is done)
+                while pending and (len(pending) >= 2 * n_workers or shard is None or pending[0].ready()):
+                    _merge_shard(pending.popleft().get(), writer, feature_writer, token_writer)
+        if token_writer is not None:
+            token_writer.close()
+            token_columns.move_token_columns(outfile_path + ".part", outfile_path)
+        os.replace(feature_store.features_path(outfile_path + ".part"), feature_store.features_path(outfile_path))
+        os.replace(outfile_path + ".part", outfile_path)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        _worker_preprocessor, _worker_model = None, None
+
+    print("Preprocessed", num_shards, "shards with", n_workers, "processes in",
+          round(time.perf_counter() - start_time, 2), "seconds")
+    print("Wrote: ", outfile_path)
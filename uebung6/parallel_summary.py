@@ -0,0 +1,48 @@
+import functools
+import multiprocessing
+import os
+import time
+import token_columns
+import tweet_summary
+
+
+def _summarize_shard(infile_path: str, statistics: tuple) -> tweet_summary.TweetSummary:
+    """
+    Map step, runs in a worker process: counts the tweets of one shard file (tokens from its token columns,
+    if it has some) and returns the summary without the memory-mapped columns.
+    """
+    columns = token_columns.load_token_columns(infile_path) if "pos" in statistics else None
+    summary = tweet_summary.TweetSummary.from_file(infile_path, statistics, columns)
+    summary.columns = None
+    return summary
+
+
+def summarize_files(infile_paths: list, statistics=None, n_workers: int = None) -> tweet_summary.TweetSummary:
+    """
+    Computes the summary (see tweet_summary.TweetSummary) of tweets split over many files (e.g. daily files)
+    in n_workers processes (default: number of cores): each file is counted by one worker,
+    the partial summaries are merged in the order of infile_paths as soon as they are ready.
+    The result is identical to one pass over all files in this order, only one file per worker is in memory at once.
+    :param infile_paths: list of str
+    :param statistics: iterable of str
+    :param n_workers: int
+    :return: summary: tweet_summary.TweetSummary
+    """
+    statistics = tuple(tweet_summary.STATISTIC_FIELDS) if statistics is None else tuple(statistics)
+    n_workers = min(n_workers or os.cpu_count(), max(len(infile_paths), 1))
+    start_time = time.perf_counter()
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context("spawn")
+
+    summary = tweet_summary.TweetSummary(statistics)
+    with context.Pool(n_workers) as pool:
+        # imap returns the results in input order, so the merge (reduce step) is deterministic
+        for shard_summary in pool.imap(functools.partial(_summarize_shard, statistics=statistics), infile_paths):
+            summary.merge(shard_summary)
+
+    print("Summarized", summary.num_tweets, "tweets of", len(infile_paths), "files with", n_workers, "processes in",
+          round(time.perf_counter() - start_time, 2), "seconds")
+    return summary
@@ -1,29 +1,75 @@
-import json
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import numpy as np
-import analyzation_helpers
+import parallel_summary
+import token_columns
+import tweet_summary
+
+# statistics of the tweet summary (see tweet_summary.STATISTIC_FIELDS) each chart needs
+CHART_STATISTICS = {"sentiment_distribution": ("sentiments",),
+                    "token_distribution": ("pos",),
+                    "top10_hashtags": ("hashtags",),
+                    "top10_hashtags_sentiments": ("hashtags",),
+                    "top10_users_sentiments": ("users",),
+                    "top10_users_weekdays": ("users",),
+                    "daily_tweets": ("days_hours",),
+                    "hourly_tweets": ("days_hours",)}
+
+
+def statistics_for_charts(charts) -> list:
+    """
+    Returns the statistics of the tweet summary needed to plot the given charts (names of PlotterUebung6 methods).
+    :param charts: iterable of str
+    :return: statistics: list
+    """
+    statistics = []
+    for chart in charts:
+        if chart not in CHART_STATISTICS:
+            raise ValueError("Unknown chart: " + chart)
+        statistics.extend(statistic for statistic in CHART_STATISTICS[chart] if statistic not in statistics)
+    return statistics
 
 
 class PlotterUebung6():
     """
     Holds methods for analyzing the tweet dataset and plotting its data in various charts.
+    All statistics are computed in one pass over the file (see tweet_summary.TweetSummary),
+    only those needed for the given charts (names of the plot methods, default: all),
+    so e.g. the tokens are only counted if token_distribution is requested.
+    infile_path can also be a list of files (e.g. daily shards), which are counted in parallel processes
+    (see parallel_summary.summarize_files).
+    Instead of a file an existing summary can be given (e.g. a saved summary updated with a new batch of tweets,
+    see tweet_summary.update_saved_summary), then the tweets aren't read at all.
     """
 
-    def __init__(self, infile_path:str) -> None:
+    def __init__(self, infile_path:str = None, charts=None, summary: tweet_summary.TweetSummary = None) -> None:
         self.infile_path = infile_path
-
-        with open(infile_path, mode="r", encoding="utf-8") as fin:
-            self.tweets_list = json.load(fin)
-
-        self.most_active_users_sentiments, \
-        self.most_active_users_tweet_days = analyzation_helpers.analyze_most_active_users(self.tweets_list)
-
-        self.most_frequent_hashtags, \
-        self.most_frequent_hashtags_sentiments = analyzation_helpers.analyze_most_frequent_hashtags(self.tweets_list)
-
-        self.weekday_frequency,\
-            self.hour_frequency = analyzation_helpers.get_tweet_daily_hourly_frequency(self.tweets_list)
+        self.charts = tuple(CHART_STATISTICS) if charts is None else tuple(charts)
+        statistics = statistics_for_charts(self.charts)
+
+        if summary is None and isinstance(infile_path, (list, tuple)):
+            summary = parallel_summary.summarize_files(infile_path, statistics)
+        elif summary is None:
+            columns = None  # None if tokens are saved as dicts
+            if "token_distribution" in self.charts:
+                columns = token_columns.load_token_columns(infile_path)
+            summary = tweet_summary.TweetSummary.from_file(infile_path, statistics, columns)
+        elif not set(statistics) <= set(summary.statistics):
+            raise ValueError("Summary lacks statistics for the charts: " +
+                             str(sorted(set(statistics) - set(summary.statistics))))
+        self.summary = summary
+
+        if "top10_users_sentiments" in self.charts or "top10_users_weekdays" in self.charts:
+            self.most_active_users_sentiments, \
+            self.most_active_users_tweet_days = self.summary.most_active_users()
+
+        if "top10_hashtags" in self.charts or "top10_hashtags_sentiments" in self.charts:
+            self.most_frequent_hashtags, \
+            self.most_frequent_hashtags_sentiments = self.summary.most_frequent_hashtags()
+
+        if "daily_tweets" in self.charts or "hourly_tweets" in self.charts:
+            self.weekday_frequency,\
+                self.hour_frequency = self.summary.daily_hourly_frequency()
 
 
     def sentiment_distribution(self):
@@ -32,17 +78,8 @@ class PlotterUebung6():
         Plot will be a simple bar chart.
         :return: None
         """
-        negative = neutral = positive = 0
-        total = 0
-        for tweet in self.tweets_list:
-            prediction = tweet["predicted-sentiment"]
-            if prediction == 0:
-                negative += 1
-            elif prediction == 1:
-                neutral += 1
-            else:
-                positive += 1
-            total += 1
+        negative, neutral, positive = self.summary.sentiment_counts
+        total = self.summary.num_tweets
 
         print("Sentiment distribution of", total, "tweets:")
         print("---> negative:", negative, "neutral:", neutral, "positive:", positive)
@@ -70,18 +107,7 @@ class PlotterUebung6():
         Plot will be a pie chart.
         :return: None
         """
-        tokens = {}
-        for tweet in self.tweets_list:
-            token_list = tweet["tokens-pos-attributes"]
-            for token in token_list:
-                pos_token = token.get("pos")
-                try:
-                    pos_value = tokens.get(pos_token)
-                    pos_value += 1
-                    tokens[pos_token] = pos_value
-
-                except Exception:
-                    tokens[pos_token] = 1
+        tokens = self.summary.pos_counts
 
         pos = tokens.keys()
         pos_counts = tokens.values()
@@ -1,105 +1,340 @@
-import io
-import spacy
+import collections
+import itertools
+import os
+import shutil
 import numpy as np
-import json
 
-import torch
 import re
+import time
 import ffnetwork
+import tweet_io
+import tweet_cache
+import embedding_store
+import feature_store
+import token_columns
+from embedding_store import EmbeddingStore
+
+SPACY_MODEL = "de_core_news_sm"
+
+# token attributes written to "tokens-pos-attributes" and the spacy Token attribute they are read from
+TOKEN_ATTRIBUTES = {"text": "text", "lemma": "lemma_", "pos": "pos_", "tag": "tag_", "dep": "dep_",
+                    "shape": "shape_", "alpha": "is_alpha", "stop": "is_stop"}
+TOKEN_FIELDS = tuple(TOKEN_ATTRIBUTES)
+
+# pipeline components needed for each token attribute (text, shape, alpha and stop only need the tokenizer)
+FIELD_COMPONENTS = {"text": set(), "shape": set(), "alpha": set(), "stop": set(),
+                    "pos": {"tok2vec", "tagger", "morphologizer", "attribute_ruler"},
+                    "tag": {"tok2vec", "tagger", "attribute_ruler"},
+                    "lemma": {"tok2vec", "tagger", "morphologizer", "attribute_ruler", "lemmatizer",
+                              "trainable_lemmatizer"},
+                    "dep": {"tok2vec", "parser"}}
+ALL_COMPONENTS = {"tok2vec", "tagger", "morphologizer", "attribute_ruler", "lemmatizer", "trainable_lemmatizer",
+                  "parser", "senter", "ner", "entity_ruler"}
+
+# named pipeline profiles: token attributes each profile can produce
+# (no profile needs the named entity recognizer, so "full" excludes it as well)
+PIPELINE_PROFILES = {"tokenize": ("text", "shape", "alpha", "stop"),
+                     "tag": ("text", "lemma", "pos", "tag", "shape", "alpha", "stop"),
+                     "full": TOKEN_FIELDS}
+
+
+def components_for_fields(fields) -> set:
+    """
+    Returns the names of the pipeline components needed to fill the given token attributes.
+    :param fields: iterable of str
+    :return: components: set
+    """
+    components = set()
+    for field in fields:
+        components |= FIELD_COMPONENTS[field]
+    return components
+
+
+def load_pipeline(components: set):
+    """
+    Loads the spacy model with only the given components, all others are excluded (not even loaded).
+    spacy is imported here, so runs that never tokenize don't import it at all.
+    :param components: set
+    :return: nlp: spacy.Language
+    """
+    import spacy
+    excluded = sorted(ALL_COMPONENTS - components)
+    print("Loading spacy model", SPACY_MODEL, "without components", excluded)
+    return spacy.load(SPACY_MODEL, exclude=excluded)
+
 
 class TweetPreprocessor():
     """
-    Reads fastTextEmbeddings out of .vec file into dictionary when instantiated.
+    Memory-maps the fastText embeddings of the .vec file when instantiated
+    (the .vec file is converted to a binary store on first use, see embedding_store.py).
+    If vocabulary_paths (twitter datasets) are given, only the vectors of tokens occurring in those datasets
+    are loaded; the pruned table is cached next to the embeddings for later runs on the same datasets.
+    embedding_dtype selects a full precision ("float32") or quantized ("float16", "int8") embedding table.
     Class methods implement further twitter data preprocessing.
     """
 
-    def __init__(self, embeddings_path: str):
+    def __init__(self, embeddings_path: str, vocabulary_paths: list = None, embedding_dtype: str = "float32"):
         self.embeddings_path = embeddings_path
-        self.vocab = 0
-        self.vecsize = 0
-        self.vector_dict = self.load_vectors()
+        self.vocabulary_paths = vocabulary_paths
+        self.embedding_dtype = embedding_dtype
+        self.pipelines = {}  # spacy pipelines by needed components, loaded on first use (see pipeline)
         self.embeddings = self.load_vectors()
-        self.nlp = spacy.load("de_core_news_sm")
+        self.vocab = self.embeddings.vocab
+        self.vecsize = self.embeddings.vecsize
+        self.word_index = self.embeddings.word_index
+        self.embedding_matrix = self.embeddings.matrix
 
-    def load_vectors(self):
+    @property
+    def nlp(self):
         """
-        Function to read fastText embeddings out of .vec file to a dictionary.
-        Source: https://fasttext.cc/docs/en/crawl-vectors.html
+        The spacy pipeline of the "full" profile.
         """
-        fin = io.open(self.embeddings_path, 'r', encoding='utf-8', newline='\n', errors='ignore')
-        n, d = map(int, fin.readline().split())
-        self.vocab = n
-        self.vecsize = d
-        data = {}
-        for line in fin:
-            tokens = line.rstrip().split(' ')
-            data[tokens[0]] = list(map(float, tokens[1:]))
-        return data
+        return self.pipeline("full")
 
-    def convert_tweet(self, string: str) -> list():
+    def pipeline(self, profile: str = "full", fields=None):
         """
-        Tokenizes twitter data via spacy and returns list of word vectors.
+        Returns spacy pipeline of the named profile (see PIPELINE_PROFILES), or, if fields is given,
+        the pipeline with only the components needed for those token attributes.
+        Pipelines are loaded lazily and reused.
         """
-        vectors = []  # List of word vectors of the string/ tweet
+        if fields is None:
+            fields = PIPELINE_PROFILES[profile]
+        components = frozenset(components_for_fields(fields))
+        if components not in self.pipelines:
+            self.pipelines[components] = load_pipeline(components)
+        return self.pipelines[components]
 
+    def load_vectors(self) -> EmbeddingStore:
+        """
+        Function to load fastText embeddings as memory-mapped matrix (of embedding_dtype) with dictionary word -> row.
+        The .vec file is only parsed once and converted into a binary store next to it.
+        With vocabulary_paths only the rows of the datasets' tokens are loaded.
+        Source of .vec format: https://fasttext.cc/docs/en/crawl-vectors.html
+        """
+        if self.vocabulary_paths:
+            return EmbeddingStore.for_datasets(self.embeddings_path, self.vocabulary_paths, self.collect_vocabulary,
+                                               self.embedding_dtype)
+        return EmbeddingStore.from_vec_file(self.embeddings_path, self.embedding_dtype)
+
+    def collect_vocabulary(self, dataset_paths: list, batch_size: int = 1000) -> set:
+        """
+        Tokenizes all tweets of the datasets (tokenizer only) and returns the set of token texts.
+        """
+        vocabulary = set()
+        for dataset_path in dataset_paths:
+            texts = (tweet["text"] for tweet in tweet_io.iter_tweets(dataset_path))
+            for doc in self.pipeline("tokenize").pipe(texts, batch_size=batch_size):
+                vocabulary.update(token.text for token in doc)
+        return vocabulary
+
+    def convert_tweet(self, string: str) -> np.ndarray:
+        """
+        Tokenizes twitter data via spacy and returns the rows of the tokens' word vectors in the embedding matrix.
+        Tokens without fastText vector are ignored.
+        """
         try:
-            for token in self.nlp(string):  # tokenizing via spacy
-                value_list = self.vector_dict.get(token.text)
-                if value_list is not None:  # ignore Vectors which are not in Fasttext
-                    new_value_list = []
-                    for value in value_list:
-                        value_as_float = float(value)
-                        new_value_list.append(value_as_float)
-                    vectors.append(new_value_list)
+            return self.convert_doc(self.pipeline("tokenize")(string))  # tokenizing via spacy
         except Exception as e:
             print(e)
-        return vectors
+        return np.empty(0, dtype=np.int64)
+
+    def convert_doc(self, doc) -> np.ndarray:
+        """
+        Returns the rows of the word vectors of an already tokenized spacy Doc in the embedding matrix.
+        Used to avoid parsing the same tweet text twice.
+        """
+        return self.embeddings.lookup(token.text for token in doc)
 
-    def convert_dataset(self, infile_path: str, outfile_path: str):
+    def pipe_tweets(self, tweets, batch_size: int = 256, n_process: int = 1, profile: str = "full", fields=None):
         """
-        Reads twitter dataset and preprocesses the tweets via convert_tweet method.
-        Tweets are represented as max, min and avg vectors and saved with the other tweet data in the corresponding files.
+        Runs the spacy pipeline of the profile (or of the token attributes in fields, see pipeline)
+        batch-wise over the texts of the tweets via nlp.pipe.
+        tweets can be a list or any iterable (e.g. tweet_io.iter_tweets), it is consumed lazily.
+        With n_process > 1 the batches are distributed over several worker processes.
+        Yields (doc, tweet) tuples in the same order as tweets.
         """
-        with open(infile_path, mode="r", encoding="utf-8") as fin:
-            tweets_list = json.load(fin)
-            new_tweets_list = []
-            for tweet in tweets_list:
-                vector_list = self.convert_tweet(tweet["text"])
+        texts_with_tweets = ((tweet["text"], tweet) for tweet in tweets)
+        return self.pipeline(profile, fields).pipe(texts_with_tweets, as_tuples=True, batch_size=batch_size, n_process=n_process)
 
-                if vector_list:  # if list not empty
-                    max_vector = np.max(vector_list, 0)
-                    min_vector = np.min(vector_list, 0)
-                    avg_vector = np.average(vector_list, 0)
-                    tweet["tweetmax"] = max_vector.tolist()
-                    tweet["tweetmin"] = min_vector.tolist()
-                    tweet["tweetavg"] = avg_vector.tolist()
-                    new_tweets_list.append(tweet)
+    def convert_dataset(self, infile_path: str, outfile_path: str, batch_size: int = 256, n_process: int = 1,
+                        chunk_size: int = 4096):
+        """
+        Reads twitter dataset tweet by tweet (json array or JSON Lines, see tweet_io.iter_tweets)
+        and preprocesses the tweets via spacy's nlp.pipe (see pipe_tweets) with given batch size and number of processes.
+        Tweets are represented as max, min and avg vectors, which are pooled for chunk_size tweets at once
+        (see EmbeddingStore.pool_ragged). Each chunk is written as soon as it is ready:
+        the vectors go to the binary sidecar "<outfile_path>.features.npy" (see feature_store.py),
+        the outfile keeps the other tweet data and the tweet's row in the sidecar ("features-row").
+        """
+        start_time = time.perf_counter()
+        num_tweets = 0
+        chunk_tweets, chunk_indices = [], []
+        with tweet_io.TweetWriter(outfile_path, indent=4) as writer, \
+                feature_store.FeatureWriter(feature_store.features_path(outfile_path), self.vecsize) as feature_writer:
+            for tweet_text_doc, tweet in self.pipe_tweets(tweet_io.iter_tweets(infile_path), batch_size, n_process,
+                                                          profile="tokenize"):
+                chunk_tweets.append(tweet)
+                chunk_indices.append(self.convert_doc(tweet_text_doc))
+                if len(chunk_tweets) == chunk_size:
+                    self.write_pooled_chunk(writer, feature_writer, chunk_tweets, chunk_indices)
+                    chunk_tweets, chunk_indices = [], []
+                num_tweets += 1
 
-                else:  # no token in fasttext -> remove tweet from json file
-                    pass
+            self.write_pooled_chunk(writer, feature_writer, chunk_tweets, chunk_indices)
+
+        print_throughput(num_tweets, time.perf_counter() - start_time, batch_size, n_process)
+        print("Wrote: ", outfile_path, feature_store.features_path(outfile_path))
+
+    def write_pooled_chunk(self, writer: tweet_io.TweetWriter, feature_writer: feature_store.FeatureWriter,
+                           tweets: list, index_arrays: list) -> None:
+        """
+        Pools max, min and avg vectors of all tweets at once, appends them to the feature sidecar
+        and writes the tweets with their row in the sidecar. Tweets without token in fasttext are removed.
+        """
+        indices, offsets = embedding_store.ragged_offsets(index_arrays)
+        has_tokens, pooled_vectors = self.embeddings.pool_ragged(indices, offsets)
+        first_row = feature_writer.write_rows(pooled_vectors)
+        kept_tweets = [tweet for tweet, tweet_has_tokens in zip(tweets, has_tokens) if tweet_has_tokens]
+        for j, tweet in enumerate(kept_tweets):
+            tweet["features-row"] = first_row + j
+            writer.write(tweet)
+
+    def pipe_uncached_tweets(self, tweets, cache: tweet_cache.TweetCache = None, batch_size: int = 256,
+                             n_process: int = 1, fields=TOKEN_FIELDS, in_flight: dict = None):
+        """
+        Like pipe_tweets, but looks up every tweet in the cache first and only runs spacy on cache misses.
+        Yields (doc, tweet, cache_key, cached_entry) tuples in input order:
+        doc is None for cache hits, cached_entry is None for misses (see tweet_cache.TweetCache.get).
+        Without cache all tweets are misses and cache_key is None.
+        If in_flight is given, every miss gets an empty entry {"tokens", "vectors", "sentiment"} there, which the
+        caller fills while processing it. Later copies of the same text (retweets) read before that entry is
+        written to the cache are yielded as hits with this entry, so they don't run through spacy again.
+        """
+        if cache is None:
+            for tweet_text_doc, tweet in self.pipe_tweets(tweets, batch_size, n_process, fields=fields):
+                yield tweet_text_doc, tweet, None, None
+            return
+
+        pending = collections.deque()  # (tweet, cache_key, cached_entry) in input order, filled while spacy reads
 
-            with open(outfile_path, mode="w", encoding="utf-8") as fout:
-                json_string = json.dumps(new_tweets_list, indent=4)
-                fout.write(json_string)
-                print("Wrote: ", outfile_path)
-                fout.close()
+        def texts_of_misses():
+            for tweet in tweets:
+                cache_key = cache.key(tweet["text"])
+                if in_flight is not None and cache_key in in_flight:
+                    cached_entry = in_flight[cache_key]
+                    cache.hits += 1
+                else:
+                    cached_entry = cache.get(cache_key)
+                    if cached_entry is None and in_flight is not None:
+                        in_flight[cache_key] = {"tokens": None, "vectors": None, "sentiment": None}
+                pending.append((tweet, cache_key, cached_entry))
+                if cached_entry is None:
+                    yield tweet["text"]
+
+        docs = self.pipeline(fields=fields).pipe(texts_of_misses(), batch_size=batch_size, n_process=n_process)
+        while True:
+            tweet_text_doc = next(docs, None)  # reading the next doc also fills pending up to its tweet
+            while pending and pending[0][2] is not None:
+                tweet, cache_key, cached_entry = pending.popleft()
+                yield None, tweet, cache_key, cached_entry
+            if tweet_text_doc is None:
+                return
+            tweet, cache_key, cached_entry = pending.popleft()
+            yield tweet_text_doc, tweet, cache_key, None
+
+    def embeddings_source(self) -> tuple:
+        """
+        Returns (path, modification time, dtype) of the full embeddings the vectors come from: the binary store
+        of the .vec file if it was created, otherwise the .vec file. A pruned store (see EmbeddingStore.for_datasets)
+        holds the same vectors for its tokens, so this doesn't change when only the datasets change.
+        :return: (path, mtime, dtype): tuple(str, float, str)
+        """
+        source_path = embedding_store.store_path_for(self.embeddings_path) + ".npy"
+        if not os.path.isfile(source_path):
+            source_path = self.embeddings_path
+        return os.path.abspath(source_path), os.path.getmtime(source_path), self.embedding_dtype
+
+    def cache_fingerprint(self, model: ffnetwork.FeedForwardNetwork, tweet_representation: str,
+                          fields=TOKEN_FIELDS) -> str:
+        """
+        Returns fingerprint of everything the cached results depend on:
+        spacy pipeline and token attributes, source of the embeddings (see embeddings_source),
+        model weights and tweet representation.
+        """
+        nlp = self.pipeline(fields=fields)
+        return tweet_cache.make_fingerprint(nlp.meta["name"], nlp.meta["version"], nlp.pipe_names, fields,
+                                            *self.embeddings_source(),
+                                            ffnetwork.model_fingerprint(model), tweet_representation)
 
     def preprocess_with_prediction(self, infile_path: str, outfile_path: str, model: ffnetwork.FeedForwardNetwork,
-                                   tweet_representation: str):
+                                   tweet_representation: str, batch_size: int = 256, n_process: int = 1,
+                                   inference_batch_size: int = 4096, resume: bool = True, cache_path: str = None,
+                                   token_fields=TOKEN_FIELDS, columnar_tokens: bool = False):
         """
-        Iterates through twitter data, tokenizes the tweets and performs POS tagging.
+        Iterates through twitter data tweet by tweet (json array or JSON Lines, see tweet_io.iter_tweets),
+        tokenizes the tweets and performs POS tagging batch-wise via spacy's nlp.pipe (see pipe_tweets)
+        with given batch size and number of processes.
         Also finds all hashtags in a tweet.
-        Then predicts sentiment with given model and writes preprocessed tweet to json file.
+        Then predicts sentiment with given model in chunks of inference_batch_size tweets
+        and writes each chunk of preprocessed tweets to the outfile, so memory use doesn't grow with the dataset.
+        All three tweet representations (max, min and avg vectors) are saved to the feature sidecar
+        "<outfile_path>.features.npy" (row "features-row" of each tweet), so the sentiment can be predicted again
+        with another model or representation via repredict_file without running spacy.
+        The tweets are written to "<outfile_path>.part" which is renamed to outfile_path when all tweets are done.
+        After every chunk a checkpoint "<outfile_path>.checkpoint" is saved. If resume is True, an interrupted run
+        with the same input file (path, size and modification time), model, embeddings, tweet representation
+        and token settings continues after the last checkpoint.
+        If cache_path is given, results of already seen tweet texts are taken from that cache (see tweet_cache.py)
+        instead of running spacy and the model again.
+        token_fields selects the attributes saved per token (see TOKEN_ATTRIBUTES), spacy components
+        which none of them needs are not loaded.
+        With columnar_tokens the tokens are not saved as dicts in "tokens-pos-attributes", but dictionary-encoded
+        in the token sidecar files of the outfile (see token_columns.py), each tweet gets its "tokens-row".
         """
+        start_time = time.perf_counter()
+        chunk = []  # (tweet, embedding rows, cache_key, cached_entry) of tweets to be written together
+
+        cache = None
+        in_flight = None  # cache key -> entry of tweets not yet in the cache (see pipe_uncached_tweets)
+        if cache_path is not None:
+            in_flight = {}
+            cache = tweet_cache.TweetCache(cache_path, self.cache_fingerprint(model, tweet_representation,
+                                                                              token_fields))
+        token_fields = tuple(token_fields)
+        token_attributes = [(field, TOKEN_ATTRIBUTES[field]) for field in token_fields]
 
-        with open(infile_path, mode="r", encoding="utf-8") as fin:
-            tweets_list = json.load(fin)
-            new_tweets_list = []
+        part_path = outfile_path + ".part"
+        checkpoint_path = outfile_path + ".checkpoint"
+        # everything the written tweets depend on, a checkpoint of another job isn't resumed
+        job = {"infile_path": os.path.abspath(infile_path), "infile_size": os.path.getsize(infile_path),
+               "infile_mtime": os.path.getmtime(infile_path), "model": ffnetwork.model_fingerprint(model),
+               "embeddings": list(self.embeddings_source()), "tweet_representation": tweet_representation,
+               "token_fields": list(token_fields), "columnar_tokens": columnar_tokens}
+        features_part_path = feature_store.features_path(part_path)
+        checkpoint = tweet_io.load_checkpoint(checkpoint_path, job, part_path) if resume else None
+        if checkpoint is not None and ("feature_rows" not in checkpoint or not os.path.isfile(features_part_path)):
+            checkpoint = None
+        if checkpoint is not None and columnar_tokens and \
+                not all(os.path.isfile(path) for path in token_columns.token_columns_paths(part_path).values()):
+            checkpoint = None
+        skipped_tweets = checkpoint["input_tweets"] if checkpoint is not None else 0
+        if skipped_tweets:
+            print("Resuming preprocessing of", infile_path, "after tweet No. ", skipped_tweets - 1)
+        tweets = itertools.islice(tweet_io.iter_tweets(infile_path), skipped_tweets, None)
 
-            i = 0
-            for tweet in tweets_list:
-                print("Tokenizing and tagging tweet No. ", i)
-                tweet_text_doc = self.nlp(tweet["text"])
+        feature_rows = checkpoint["feature_rows"] if checkpoint is not None else None
+        token_writer = None
+        if columnar_tokens:
+            token_state = checkpoint["token_columns"] if checkpoint is not None else None
+            token_writer = token_columns.TokenColumnsWriter(part_path, token_fields, resume_state=token_state)
+        with tweet_io.TweetWriter(part_path, resume_state=checkpoint) as writer, \
+                feature_store.FeatureWriter(features_part_path, self.vecsize, resume_rows=feature_rows) as feature_writer:
+            i = skipped_tweets
+            for tweet_text_doc, tweet, cache_key, cached_entry in self.pipe_uncached_tweets(tweets, cache, batch_size,
+                                                                                            n_process, token_fields,
+                                                                                            in_flight):
+                if i % batch_size == 0:
+                    print("Tokenizing and tagging tweet No. ", i)
 
                 # Save hashtags of tweet in json
                 hashtags = []
@@ -108,54 +343,162 @@ class TweetPreprocessor():
                     hashtags.append(tweet["text"][start:end])
                 tweet["hashtags"] = hashtags
 
-                tokens_pos_attributes_list = []
+                if cached_entry is not None:
+                    tweet["tokens-pos-attributes"] = cached_entry["tokens"]
+                    indices = None
+                    has_tokens = cached_entry["vectors"] is not None
 
-                for token in tweet_text_doc:
-                    token_pos_attributes = {"text": token.text, "lemma": token.lemma_, "pos": token.pos_,
-                                            "tag": token.tag_, "dep": token.dep_, "shape": token.shape_,
-                                            "alpha": token.is_alpha, "stop": token.is_stop}
-                    tokens_pos_attributes_list.append(token_pos_attributes)
+                else:
+                    tokens_pos_attributes_list = []
 
-                tweet["tokens-pos-attributes"] = tokens_pos_attributes_list
+                    for token in tweet_text_doc:
+                        token_pos_attributes = {field: getattr(token, attribute)
+                                                for field, attribute in token_attributes}
+                        tokens_pos_attributes_list.append(token_pos_attributes)
 
-                vector_list = self.convert_tweet(tweet["text"])
+                    tweet["tokens-pos-attributes"] = tokens_pos_attributes_list
 
-                if vector_list:  # if list not empty
-                    if tweet_representation == "tweetmin":
-                        vector = np.min(vector_list, 0)
-                    elif tweet_representation == "tweetmax":
-                        vector = np.max(vector_list, 0)
-                    else:
-                        vector = np.average(vector_list, 0)
+                    indices = self.convert_doc(tweet_text_doc)  # reuse doc of POS tagging
+                    has_tokens = indices.size > 0
+                    if in_flight is not None:
+                        # copies of this text in flight take the tokens now, vectors and sentiment once predicted
+                        in_flight[cache_key]["tokens"] = tokens_pos_attributes_list
+                        in_flight[cache_key]["vectors"] = {} if has_tokens else None
 
-                    with torch.no_grad():
-                        model.to("cpu")
+                if has_tokens:  # if tweet has tokens in fasttext
+                    chunk.append((tweet, indices, cache_key, cached_entry))
+                    if len(chunk) == inference_batch_size:
+                        write_with_predictions(writer, feature_writer, chunk, self.embeddings, model,
+                                               tweet_representation, cache, token_writer, in_flight)
+                        tweet_io.save_checkpoint(checkpoint_path, job, i + 1, writer, feature_writer, token_writer)
+                        chunk = []
 
-                        # set dropout and batch normalization layers to evaluation mode
-                        model.eval()
-                        # compute the prediction with the trained NN
-                        processed_input = torch.FloatTensor([vector])
+                else:  # no token in fasttext -> remove tweet from json file
+                    if cache is not None and cached_entry is None:
+                        cache.put(cache_key, tweet["tokens-pos-attributes"], None, None)
+                        del in_flight[cache_key]  # answered by the cache from now on
 
-                        # 0 = negative, 1 = neutral, 2 = positive
-                        model_pred = model(processed_input)
-                        pred_class = torch.argmax(model_pred.data, 1)
+                i += 1
 
-                        tweet["predicted-sentiment"] = pred_class.item()
+            write_with_predictions(writer, feature_writer, chunk, self.embeddings, model, tweet_representation, cache,
+                                   token_writer, in_flight)
 
-                        #print("Text:", tweet["text"])
-                        # Print Predicted Class
-                        #print("Label for Text:", str(pred_class.item()))
+        if token_writer is not None:
+            token_writer.close()
+            token_columns.move_token_columns(part_path, outfile_path)
+        os.replace(features_part_path, feature_store.features_path(outfile_path))
+        os.replace(part_path, outfile_path)
+        if os.path.isfile(checkpoint_path):
+            os.remove(checkpoint_path)
 
-                    new_tweets_list.append(tweet)
+        print_throughput(i - skipped_tweets, time.perf_counter() - start_time, batch_size, n_process)
+        if cache is not None:
+            cache.print_hit_rate()
+            cache.close()
+        print("Wrote: ", outfile_path)
 
-                else:  # no token in fasttext -> remove tweet from json file
-                    pass
 
-                i += 1
+def write_with_predictions(writer: tweet_io.TweetWriter, feature_writer: feature_store.FeatureWriter, chunk: list,
+                           embeddings: EmbeddingStore, model: ffnetwork.FeedForwardNetwork, tweet_representation: str,
+                           cache: tweet_cache.TweetCache = None,
+                           token_writer: token_columns.TokenColumnsWriter = None, in_flight: dict = None) -> None:
+    """
+    Pools the tweet vectors of all tweets of the chunk that weren't in the cache at once (see
+    EmbeddingStore.pool_ragged) and predicts their sentiment together,
+    saves it as "predicted-sentiment" (0 = negative, 1 = neutral, 2 = positive),
+    adds the new results to the cache, appends the vectors of all tweets of the chunk to the feature sidecar
+    and writes the tweets with their row in the sidecar ("features-row").
+    With token_writer the tokens are moved from "tokens-pos-attributes" to the token columns ("tokens-row").
+    chunk holds (tweet, indices, cache_key, cached_entry) tuples, indices is None for cached tweets.
+    The entries of the new tweets in in_flight (see TweetPreprocessor.pipe_uncached_tweets) get their vectors
+    and sentiment before the cached tweets are handled, so copies of a new tweet (in this or a later chunk)
+    reuse its results; afterwards the cache answers for them.
+    """
+    chunk_vectors = np.empty((len(chunk), len(feature_store.TWEET_REPRESENTATIONS), embeddings.vecsize),
+                             dtype=np.float32)
+    new_positions = [j for j, (tweet, indices, cache_key, cached_entry) in enumerate(chunk) if cached_entry is None]
+    if new_positions:
+        indices, offsets = embedding_store.ragged_offsets([chunk[j][1] for j in new_positions])
+        has_tokens, pooled_vectors = embeddings.pool_ragged(indices, offsets)  # all tweets of chunk have tokens
+        for k, representation in enumerate(feature_store.TWEET_REPRESENTATIONS):
+            chunk_vectors[new_positions, k] = pooled_vectors[representation]
+        # compute the predictions with the trained NN
+        predicted_classes = ffnetwork.predict_nn(model, pooled_vectors[tweet_representation], len(new_positions))
+        for j, pred_class in zip(new_positions, predicted_classes.tolist()):
+            tweet, tweet_indices, cache_key, cached_entry = chunk[j]
+            tweet["predicted-sentiment"] = pred_class
+            if cache is not None:
+                tweet_vectors = dict(zip(feature_store.TWEET_REPRESENTATIONS, chunk_vectors[j]))
+                cache.put(cache_key, tweet["tokens-pos-attributes"], tweet_vectors, pred_class)
+            if in_flight is not None:
+                in_flight_entry = in_flight.pop(cache_key)
+                in_flight_entry["vectors"].update(tweet_vectors)
+                in_flight_entry["sentiment"] = pred_class
+
+    for j, (tweet, indices, cache_key, cached_entry) in enumerate(chunk):
+        if cached_entry is not None:
+            tweet["predicted-sentiment"] = cached_entry["sentiment"]
+            for k, representation in enumerate(feature_store.TWEET_REPRESENTATIONS):
+                chunk_vectors[j, k] = cached_entry["vectors"][representation]
+
+    first_row = feature_writer.append(chunk_vectors)
+    for j, (tweet, indices, cache_key, cached_entry) in enumerate(chunk):
+        tweet["features-row"] = first_row + j
+        if token_writer is not None:
+            tweet["tokens-row"] = token_writer.write(tweet.pop("tokens-pos-attributes"))
+        writer.write(tweet)
+    if cache is not None:
+        cache.commit()
 
-            with open(outfile_path, mode="w", encoding="utf-8") as fout:
-                json_string = json.dumps(new_tweets_list)
-                fout.write(json_string)
 
-            print("Wrote: ", outfile_path)
+def repredict_file(infile_path: str, model: ffnetwork.FeedForwardNetwork, tweet_representation: str,
+                   outfile_path: str = None, inference_batch_size: int = 4096) -> None:
+    """
+    Predicts the sentiment of all tweets of a file written by TweetPreprocessor.preprocess_with_prediction again,
+    e.g. with another model or tweet representation. The tweet vectors are read from the file's feature sidecar
+    (see feature_store.py), so neither spacy nor the embeddings are needed.
+    Only "predicted-sentiment" is replaced. Without outfile_path the infile is updated.
+    :param infile_path: str
+    :param model: ffnetwork.FeedForwardNetwork
+    :param tweet_representation: str
+    :param outfile_path: str
+    :param inference_batch_size: int
+    :return: None
+    """
+    start_time = time.perf_counter()
+    outfile_path = outfile_path or infile_path
+    part_path = outfile_path + ".part"
+    features = feature_store.load_features(infile_path)
+    representation_index = feature_store.TWEET_REPRESENTATIONS.index(tweet_representation)
+
+    num_tweets = 0
+    tweets = tweet_io.iter_tweets(infile_path)
+    with tweet_io.TweetWriter(part_path) as writer:
+        for chunk in iter(lambda: list(itertools.islice(tweets, inference_batch_size)), []):
+            rows = np.array([tweet["features-row"] for tweet in chunk], dtype=np.int64)
+            predicted_classes = ffnetwork.predict_nn(model, features[rows, representation_index], len(chunk))
+            for tweet, pred_class in zip(chunk, predicted_classes.tolist()):
+                tweet["predicted-sentiment"] = pred_class
+                writer.write(tweet)
+            num_tweets += len(chunk)
+
+    if outfile_path != infile_path:
+        shutil.copyfile(feature_store.features_path(infile_path), feature_store.features_path(outfile_path))
+        if token_columns.load_token_columns(infile_path) is not None:
+            outfile_token_paths = token_columns.token_columns_paths(outfile_path)
+            for name, path in token_columns.token_columns_paths(infile_path).items():
+                shutil.copyfile(path, outfile_token_paths[name])
+    os.replace(part_path, outfile_path)
+    print("Predicted sentiment of", num_tweets, "tweets again with", tweet_representation, "in",
+          round(time.perf_counter() - start_time, 2), "seconds")
+    print("Wrote: ", outfile_path)
 
+
+def print_throughput(num_tweets: int, seconds: float, batch_size: int, n_process: int) -> float:
+    """
+    Prints and returns the number of tweets processed per second with the given nlp.pipe configuration.
+    """
+    tweets_per_second = num_tweets / seconds if seconds > 0 else float("inf")
+    print("Processed", num_tweets, "tweets in", round(seconds, 2), "seconds (batch_size:", batch_size,
+          "n_process:", str(n_process) + ") ->", round(tweets_per_second, 1), "tweets per second")
+    return tweets_per_second
@@ -0,0 +1,120 @@
+import datetime
+import numpy as np
+
+SECONDS_PER_DAY = 24 * 3600
+OFFSET_BUCKET_MINUTES = 15  # time zone offsets only change at multiples of 15 minutes
+
+
+def parse_created_at(created_at, time_zone: str = None) -> np.ndarray:
+    """
+    Parses the "created_at" strings of many tweets at once into datetime64[s] (local wall-clock time).
+    Without time_zone the time is kept in the offset of each string (like datetime.fromisoformat in
+    analyzation_helpers, "Z" -> UTC), otherwise it is converted to the given IANA time zone (e.g. "Europe/Berlin").
+    Strings in UTC ("...Z", the twitter format) are parsed by NumPy in one go, others one by one.
+    :param created_at: iterable of str
+    :param time_zone: str
+    :return: times: np.ndarray
+    """
+    created_at = list(created_at)
+    if all(date.endswith("Z") for date in created_at):
+        times = np.array([date[:-1] for date in created_at], dtype="datetime64[ms]").astype("datetime64[s]")
+    else:
+        times = []
+        for date in created_at:
+            date = datetime.datetime.fromisoformat(date.replace("Z", "+00:00"))
+            if time_zone is not None and date.tzinfo is not None:
+                date = date.astimezone(datetime.timezone.utc)  # converted to time_zone below
+            times.append(date.replace(tzinfo=None))
+        times = np.array(times, dtype="datetime64[s]")
+    if time_zone is not None:
+        times = to_time_zone(times, time_zone)
+    return times
+
+
+def to_time_zone(utc_times: np.ndarray, time_zone: str) -> np.ndarray:
+    """
+    Converts UTC datetime64 times to the wall-clock time of an IANA time zone (daylight saving time included).
+    The offset is looked up once per 15 minute bucket that occurs in the times, not once per time.
+    :param utc_times: np.ndarray
+    :param time_zone: str
+    :return: local_times: np.ndarray
+    """
+    import zoneinfo  # only needed if a time zone is given
+    zone = zoneinfo.ZoneInfo(time_zone)
+    minutes = utc_times.astype("datetime64[m]").astype(np.int64)
+    buckets, bucket_index = np.unique(minutes // OFFSET_BUCKET_MINUTES, return_inverse=True)
+    offsets = np.array([datetime.datetime.fromtimestamp(bucket * OFFSET_BUCKET_MINUTES * 60, zone)
+                        .utcoffset().total_seconds() for bucket in buckets.tolist()], dtype=np.int64)
+    return utc_times + offsets[bucket_index.reshape(-1)].astype("timedelta64[s]")
+
+
+def weekdays(times: np.ndarray) -> np.ndarray:
+    """
+    Returns weekday (Monday = 0 -> Sunday = 6) of each datetime64 time.
+    :param times: np.ndarray
+    :return: weekdays: np.ndarray
+    """
+    return (times.astype("datetime64[D]").astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+
+def _bin_seconds(bin_width) -> int:
+    bin_seconds = int(np.timedelta64(bin_width, "s").astype(np.int64))
+    if bin_seconds <= 0 or SECONDS_PER_DAY % bin_seconds:
+        raise ValueError("Bin width has to divide one day: " + str(bin_width))
+    return bin_seconds
+
+
+def bins_of_week(times: np.ndarray, bin_width=np.timedelta64(1, "h")) -> np.ndarray:
+    """
+    Returns number of the bin of width bin_width (e.g. 15 minutes, 1 hour, 1 day) each time falls into,
+    counted from Monday 0:00 (with 1 hour bins: hour of the week 0 ... 167).
+    :param times: np.ndarray
+    :param bin_width: np.timedelta64
+    :return: bins: np.ndarray
+    """
+    bin_seconds = _bin_seconds(bin_width)
+    seconds_of_day = (times - times.astype("datetime64[D]")).astype("timedelta64[s]").astype(np.int64)
+    return (weekdays(times) * SECONDS_PER_DAY + seconds_of_day) // bin_seconds
+
+
+def bucket_counts(times: np.ndarray, bin_width=np.timedelta64(1, "h")) -> (np.ndarray, np.ndarray):
+    """
+    Counts the times in consecutive buckets of bin_width from the first to the last bucket with a time
+    (a timeline, empty buckets in between are included with 0).
+    Returns (bucket_starts, counts).
+    :param times: np.ndarray
+    :param bin_width: np.timedelta64
+    :return: (bucket_starts, counts): tuple(np.ndarray, np.ndarray)
+    """
+    bin_seconds = int(np.timedelta64(bin_width, "s").astype(np.int64))
+    seconds = times.astype("datetime64[s]").astype(np.int64)
+    if seconds.size == 0:
+        return np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.int64)
+    buckets = seconds // bin_seconds
+    first_bucket = buckets.min()
+    counts = np.bincount(buckets - first_bucket)
+    bucket_starts = ((first_bucket + np.arange(len(counts))) * bin_seconds).astype("datetime64[s]")
+    return bucket_starts, counts
+
+
+def week_bin_averages(times: np.ndarray, bin_width=np.timedelta64(1, "h"), counts: np.ndarray = None) -> dict:
+    """
+    Returns the average number of tweets in each bin of the week (see bins_of_week): the tweets in a bin
+    divided by the number of days of that weekday that have tweets, rounded like in analyzation_helpers.
+    With 1 day bins these are the weekday averages, with 1 hour bins the averages of the 168 hours of a week.
+    Bins of weekdays without any tweet have average 0.
+    counts holds the number of tweets at each time (default: 1 each), e.g. for times already bucketed by hour.
+    :param times: np.ndarray
+    :param bin_width: np.timedelta64
+    :param counts: np.ndarray
+    :return: bin_averages: dict
+    """
+    bins_per_day = SECONDS_PER_DAY // _bin_seconds(bin_width)
+    totals = np.bincount(bins_of_week(times, bin_width), weights=counts, minlength=7 * bins_per_day)
+    totals = totals.astype(np.int64).tolist()
+    weekday_occurrences = np.bincount(weekdays(np.unique(times.astype("datetime64[D]"))), minlength=7).tolist()
+    bin_averages = {}
+    for week_bin, total in enumerate(totals):
+        occurrences = weekday_occurrences[week_bin // bins_per_day]
+        bin_averages[week_bin] = round(total / occurrences) if occurrences else 0
+    return bin_averages
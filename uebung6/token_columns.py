@@ -0,0 +1,271 @@
+import itertools
+import os
+import numpy as np
+import feature_store
+import tweet_io
+
+# token attributes interned in one shared string table (same string -> same code)
+STRING_FIELDS = ("text", "lemma")
+# token attributes with few distinct values, dictionary-encoded with their own table each
+CODE_FIELDS = ("pos", "tag", "dep", "shape")
+# boolean token attributes, packed as bits into the column "flags"
+FLAG_BITS = {"alpha": 1, "stop": 2}
+
+MAX_CODE = np.iinfo(np.uint16).max
+
+
+def token_columns_paths(json_path: str) -> dict:
+    """
+    Returns paths of the sidecar files holding the tokens of a preprocessed json file:
+    "tokens" (one record of codes per token), "offsets" (tokens of tweet "tokens-row" r are
+    offsets[r]:offsets[r + 1]) and "vocabulary" (JSON Lines: the saved token attributes,
+    then one [table, string] line per code in order of the codes).
+    :param json_path: str
+    :return: paths: dict
+    """
+    return {"tokens": json_path + ".tokens.npy",
+            "offsets": json_path + ".tokens-offsets.npy",
+            "vocabulary": json_path + ".tokens-vocabulary.jsonl"}
+
+
+def token_dtype(fields) -> np.dtype:
+    """
+    Returns numpy record type of one token with the given token attributes (see preprocessor.TOKEN_ATTRIBUTES).
+    :param fields: iterable of str
+    :return: dtype: np.dtype
+    """
+    columns = []
+    for field in fields:
+        if field in STRING_FIELDS:
+            columns.append((field, np.int32))
+        elif field in CODE_FIELDS:
+            columns.append((field, np.uint16))
+    if any(field in FLAG_BITS for field in fields):
+        columns.append(("flags", np.uint8))
+    return np.dtype(columns)
+
+
+def _table(field: str) -> str:
+    return "strings" if field in STRING_FIELDS else field
+
+
+def move_token_columns(source_json_path: str, target_json_path: str) -> None:
+    """
+    Renames the token sidecar files of source_json_path to those of target_json_path.
+    :param source_json_path: str
+    :param target_json_path: str
+    :return: None
+    """
+    target_paths = token_columns_paths(target_json_path)
+    for name, source_path in token_columns_paths(source_json_path).items():
+        os.replace(source_path, target_paths[name])
+
+
+class TokenColumnsWriter():
+    """
+    Writes the tokens of preprocessed tweets column-wise instead of one dict per token:
+    text and lemma as codes of interned strings, pos, tag, dep and shape as codes of their own (small) tables,
+    alpha and stop as bits of one byte, and the token offsets of every tweet.
+    New strings are appended to the vocabulary file the first time they occur.
+    If resume_state (see checkpoint()) is given, all files are cut back to that state and continued.
+    """
+
+    def __init__(self, json_path: str, fields, resume_state: dict = None):
+        self.fields = tuple(fields)
+        self.dtype = token_dtype(self.fields)
+        self.flag_fields = [field for field in self.fields if field in FLAG_BITS]
+        paths = token_columns_paths(json_path)
+        resume_state = resume_state or {}
+
+        self.tokens = feature_store.NpyAppender(paths["tokens"], (), self.dtype, resume_state.get("tokens"))
+        self.offsets = feature_store.NpyAppender(paths["offsets"], (), np.int64, resume_state.get("offsets"))
+        self.vocabulary = tweet_io.TweetWriter(paths["vocabulary"], resume_state=resume_state.get("vocabulary"))
+        self.tables = {_table(field): {} for field in self.fields if field not in FLAG_BITS}
+        if resume_state:
+            for table, string in itertools.islice(tweet_io.iter_tweets(paths["vocabulary"]), 1, None):
+                self.tables[table][string] = len(self.tables[table])
+        else:
+            self.vocabulary.write({"fields": list(self.fields)})
+            self.offsets.append(np.zeros(1, dtype=np.int64))
+
+    def code(self, field: str, string: str) -> int:
+        """
+        Returns code of string in the table of field, new strings are added to the table.
+        """
+        table = self.tables[_table(field)]
+        code = table.get(string)
+        if code is None:
+            code = len(table)
+            if field in CODE_FIELDS and code > MAX_CODE:
+                raise ValueError("Too many different values of token attribute " + field)
+            table[string] = code
+            self.vocabulary.write([_table(field), string])
+        return code
+
+    def write(self, tokens: list) -> int:
+        """
+        Appends the tokens of one tweet (list of dicts as in "tokens-pos-attributes")
+        and returns the tweet's row for "tokens-row".
+        :param tokens: list
+        :return: row: int
+        """
+        records = np.zeros(len(tokens), dtype=self.dtype)
+        for field in self.fields:
+            if field not in FLAG_BITS:
+                records[field] = [self.code(field, token[field]) for token in tokens]
+        if self.flag_fields:
+            records["flags"] = [sum(FLAG_BITS[field] for field in self.flag_fields if token[field])
+                                for token in tokens]
+        self.tokens.append(records)
+        self.offsets.append(np.array([self.tokens.num_rows], dtype=np.int64))
+        return self.offsets.num_rows - 2
+
+    def append_columns(self, columns) -> int:
+        """
+        Appends all tweets of other token columns with the same fields (e.g. of a shard, see parallel_preprocessor.py)
+        and returns the row of their first tweet, which has to be added to their "tokens-row"s.
+        Their codes are translated to the tables of this writer and their new strings are added in the order of
+        the other vocabulary file, so the result is the same as writing the tweets one by one.
+        :param columns: TokenColumns
+        :return: first_row: int
+        """
+        if tuple(columns.fields) != self.fields:
+            raise ValueError("Can't append token columns of fields " + str(columns.fields) + " to " + str(self.fields))
+        table_fields = {_table(field): field for field in self.fields if field not in FLAG_BITS}
+        code_maps = {table: [] for table in table_fields}
+        for table, string in itertools.islice(tweet_io.iter_tweets(columns.vocabulary_path), 1, None):
+            code_maps[table].append(self.code(table_fields[table], string))
+        records = np.array(columns.tokens, dtype=self.dtype)
+        for field in self.fields:
+            if field not in FLAG_BITS and len(records):
+                records[field] = np.array(code_maps[_table(field)], dtype=np.int64)[records[field]]
+        first_row = self.offsets.num_rows - 1
+        token_offset = self.tokens.num_rows
+        self.tokens.append(records)
+        self.offsets.append(np.asarray(columns.offsets[1:], dtype=np.int64) + token_offset)
+        return first_row
+
+    def checkpoint(self) -> dict:
+        """
+        Flushes everything written so far to disk and returns the state needed to resume writing at this point.
+        :return: state: dict
+        """
+        return {"tokens": self.tokens.checkpoint(), "offsets": self.offsets.checkpoint(),
+                "vocabulary": self.vocabulary.checkpoint()}
+
+    def close(self) -> None:
+        """
+        Closes all files.
+        :return: None
+        """
+        self.tokens.close()
+        self.offsets.close()
+        self.vocabulary.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TokenColumns():
+    """
+    Reads the token sidecar files of a preprocessed json file (see TokenColumnsWriter).
+    The token records and offsets are memory-mapped, only the vocabulary is loaded.
+    Tokens of single tweets can be decoded to the dicts of "tokens-pos-attributes",
+    analyses should rather work on whole columns (see positions, column and count_values).
+    """
+
+    def __init__(self, json_path: str):
+        paths = token_columns_paths(json_path)
+        self.tokens = np.load(paths["tokens"], mmap_mode="r")
+        self.offsets = np.load(paths["offsets"], mmap_mode="r")
+        self.vocabulary_path = paths["vocabulary"]
+        vocabulary = tweet_io.iter_tweets(paths["vocabulary"])
+        self.fields = tuple(next(vocabulary)["fields"])
+        self.tables = {_table(field): [] for field in self.fields if field not in FLAG_BITS}
+        for table, string in vocabulary:
+            self.tables[table].append(string)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def vocabulary(self, field: str) -> list:
+        """
+        Returns the strings of the codes of field (text and lemma share one table).
+        :param field: str
+        :return: strings: list
+        """
+        return self.tables[_table(field)]
+
+    def positions(self, rows) -> np.ndarray:
+        """
+        Returns the positions of all tokens of the tweets with the given "tokens-row"s in the token columns
+        (in order of rows).
+        :param rows: iterable of int
+        :return: positions: np.ndarray
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        tweet_starts = np.cumsum(lengths) - lengths  # start of each tweet's tokens in the result
+        return np.arange(lengths.sum(), dtype=np.int64) - np.repeat(tweet_starts - starts, lengths)
+
+    def column(self, field: str, positions: np.ndarray = None) -> np.ndarray:
+        """
+        Returns codes (or booleans for alpha and stop) of field for the tokens at positions (default: all tokens).
+        Boolean attributes that were not saved are False, like missing keys of the token dicts.
+        :param field: str
+        :param positions: np.ndarray
+        :return: column: np.ndarray
+        """
+        if field in FLAG_BITS:
+            if field not in self.fields:
+                return np.zeros(len(self.tokens) if positions is None else len(positions), dtype=bool)
+            flags = self.tokens["flags"] if positions is None else self.tokens["flags"][positions]
+            return (flags & FLAG_BITS[field]) != 0
+        return np.asarray(self.tokens[field] if positions is None else self.tokens[field][positions])
+
+    def count_values(self, field: str, positions: np.ndarray = None) -> dict:
+        """
+        Returns {value: number of tokens} of field for the tokens at positions (default: all tokens),
+        in order of the first occurrence of each value like a dict filled token by token.
+        :param field: str
+        :param positions: np.ndarray
+        :return: value_counts: dict
+        """
+        codes, first_positions, counts = np.unique(self.column(field, positions), return_index=True,
+                                                   return_counts=True)
+        order = np.argsort(first_positions, kind="stable")
+        vocabulary = self.vocabulary(field)
+        return {vocabulary[code]: count for code, count in zip(codes[order].tolist(), counts[order].tolist())}
+
+    def decode(self, row: int) -> list:
+        """
+        Returns the tokens of the tweet with "tokens-row" row as list of dicts (format of "tokens-pos-attributes").
+        :param row: int
+        :return: tokens: list
+        """
+        records = self.tokens[self.offsets[row]:self.offsets[row + 1]]
+        tokens = []
+        for record in records:
+            token = {}
+            for field in self.fields:
+                if field in FLAG_BITS:
+                    token[field] = bool(record["flags"] & FLAG_BITS[field])
+                else:
+                    token[field] = self.tables[_table(field)][record[field]]
+            tokens.append(token)
+        return tokens
+
+
+def load_token_columns(json_path: str) -> TokenColumns:
+    """
+    Returns the token columns of a preprocessed json file, or None if its tokens are saved as dicts in the file.
+    :param json_path: str
+    :return: token_columns: TokenColumns or None
+    """
+    if not os.path.isfile(token_columns_paths(json_path)["tokens"]):
+        return None
+    return TokenColumns(json_path)
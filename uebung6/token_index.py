@@ -0,0 +1,213 @@
+import string
+import numpy as np
+import time_buckets
+import token_columns
+
+
+def is_word(text: str) -> bool:
+    """
+    Returns whether a token text is counted as word (no punctuation, white space or other non-alphabetic token),
+    see analyzation_helpers.get_most_frequent_words.
+    :param text: str
+    :return: is_word: bool
+    """
+    return not (text in string.punctuation or text.isspace()) and text.isalpha()
+
+
+class TokenIndex():
+    """
+    Inverted index of the words of a tweet list, built once when the tweets are loaded: the tokens are filtered
+    like in analyzation_helpers.get_most_frequent_words (each distinct text is checked once) and every word
+    gets its postings (the tweet ids = positions in the tweet list it occurs in, with number of occurrences).
+    Hashtags, users, dates and wrong predictions are indexed as well, so the word frequencies of any subset
+    (and of intersections of subsets) come from the postings instead of a new pass over all tokens.
+    """
+
+    def __init__(self, words: list, posting_words: np.ndarray, posting_tweets: np.ndarray,
+                 posting_counts: np.ndarray, num_tweets: int):
+        self.words = words  # word code i -> words[i]
+        # postings in order of the tweets, within a tweet in order of first occurrence of the words
+        self.posting_words = posting_words
+        self.posting_tweets = posting_tweets
+        self.posting_counts = posting_counts  # occurrences of the word in the tweet
+        self.num_tweets = num_tweets
+        # postings of tweet i are at tweet_offsets[i]:tweet_offsets[i + 1]
+        self.tweet_offsets = np.searchsorted(posting_tweets, np.arange(num_tweets + 1, dtype=np.int64))
+        # inverted view: postings of word i are posting_tweets[word_order[word_offsets[i]:word_offsets[i + 1]]]
+        self.word_order = np.argsort(posting_words, kind="stable")
+        self.word_offsets = np.concatenate(([0], np.cumsum(np.bincount(posting_words, minlength=len(words)))))
+        self.word_codes = {word: code for code, word in enumerate(words)}
+        self.hashtag_postings = {}
+        self.user_postings = {}
+        self.wrong_predictions = np.empty(0, dtype=np.int64)
+        self.dated_tweets = np.empty(0, dtype=np.int64)
+        self.timestamps = np.empty(0, dtype="datetime64[s]")
+
+    @classmethod
+    def from_tweets(cls, tweets_list: list, columns: token_columns.TokenColumns = None, time_zone: str = None):
+        """
+        Builds the index of all tweets in tweets_list. If the tokens of the tweets are saved in token columns
+        ("tokens-row", see token_columns.py), the columns of the preprocessed file have to be given.
+        Dates are parsed at once, converted to time_zone if given (see time_buckets.parse_created_at).
+        """
+        if columns is not None:
+            index = cls._from_columns(tweets_list, columns)
+        else:
+            index = cls._from_token_dicts(tweets_list)
+
+        hashtag_postings, user_postings = {}, {}
+        wrong_predictions, dated_tweets, created_at = [], [], []
+        for tweet_id, tweet in enumerate(tweets_list):
+            for hashtag in tweet.get("hashtags", []):
+                hashtag_postings.setdefault(hashtag, []).append(tweet_id)
+            if "author_name" in tweet:
+                user_postings.setdefault(tweet["author_name"], []).append(tweet_id)
+            if "annotation" in tweet and tweet["annotation"] != tweet["predicted-sentiment"]:
+                wrong_predictions.append(tweet_id)
+            if "created_at" in tweet:
+                dated_tweets.append(tweet_id)
+                created_at.append(tweet["created_at"])
+
+        # a hashtag occurring twice in a tweet gets one posting
+        index.hashtag_postings = {hashtag: np.unique(tweet_ids) for hashtag, tweet_ids in hashtag_postings.items()}
+        index.user_postings = {user: np.array(tweet_ids, dtype=np.int64) for user, tweet_ids in user_postings.items()}
+        index.wrong_predictions = np.array(wrong_predictions, dtype=np.int64)
+        index.dated_tweets = np.array(dated_tweets, dtype=np.int64)
+        if created_at:
+            index.timestamps = time_buckets.parse_created_at(created_at, time_zone)
+        return index
+
+    @classmethod
+    def _from_token_dicts(cls, tweets_list: list):
+        word_codes, is_word_cache = {}, {}
+        posting_words, posting_tweets, posting_counts = [], [], []
+        for tweet_id, tweet in enumerate(tweets_list):
+            tweet_word_counts = {}
+            for token in tweet["tokens-pos-attributes"]:
+                if token.get("stop"):
+                    continue
+                text = token.get("text")
+                counted = is_word_cache.get(text)
+                if counted is None:
+                    counted = is_word_cache[text] = is_word(text)
+                if counted:
+                    code = word_codes.setdefault(text, len(word_codes))
+                    tweet_word_counts[code] = tweet_word_counts.get(code, 0) + 1
+            posting_words.extend(tweet_word_counts)
+            posting_tweets.extend([tweet_id] * len(tweet_word_counts))
+            posting_counts.extend(tweet_word_counts.values())
+        return cls(list(word_codes), np.array(posting_words, dtype=np.int64),
+                   np.array(posting_tweets, dtype=np.int64), np.array(posting_counts, dtype=np.int64),
+                   len(tweets_list))
+
+    @classmethod
+    def _from_columns(cls, tweets_list: list, columns: token_columns.TokenColumns):
+        rows = np.array([tweet["tokens-row"] for tweet in tweets_list], dtype=np.int64)
+        positions = columns.positions(rows)
+        token_tweets = np.repeat(np.arange(len(rows), dtype=np.int64), columns.offsets[rows + 1] - columns.offsets[rows])
+        words = columns.vocabulary("text")
+        is_word_code = np.array([is_word(text) for text in words], dtype=bool)
+        text_codes = columns.column("text", positions).astype(np.int64)
+        counted = ~columns.column("stop", positions) & is_word_code[text_codes]
+
+        # one posting per (tweet, word), ordered by tweet and first occurrence of the word in the tweet
+        keys = token_tweets[counted] * len(words) + text_codes[counted]
+        posting_keys, first_positions, posting_counts = np.unique(keys, return_index=True, return_counts=True)
+        order = np.argsort(first_positions, kind="stable")
+        posting_keys = posting_keys[order]
+        return cls(words, posting_keys % len(words), posting_keys // len(words), posting_counts[order], len(rows))
+
+    def postings(self, word: str) -> np.ndarray:
+        """
+        Returns ids of the tweets the word occurs in (sorted), empty if it isn't indexed.
+        :param word: str
+        :return: tweet_ids: np.ndarray
+        """
+        code = self.word_codes.get(word)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self.posting_tweets[self.word_order[self.word_offsets[code]:self.word_offsets[code + 1]]]
+
+    def tweets_with_hashtag(self, hashtag: str) -> np.ndarray:
+        """
+        Returns ids of the tweets with the hashtag (sorted).
+        :param hashtag: str
+        :return: tweet_ids: np.ndarray
+        """
+        return self.hashtag_postings.get(hashtag, np.empty(0, dtype=np.int64))
+
+    def tweets_of_user(self, user: str) -> np.ndarray:
+        """
+        Returns ids of the tweets of the user ("author_name", sorted).
+        :param user: str
+        :return: tweet_ids: np.ndarray
+        """
+        return self.user_postings.get(user, np.empty(0, dtype=np.int64))
+
+    def wrongly_classified_tweets(self) -> np.ndarray:
+        """
+        Returns ids of the tweets whose predicted sentiment differs from their annotation (sorted),
+        like analyzation_helpers.get_wrongly_classified_tweets.
+        :return: tweet_ids: np.ndarray
+        """
+        return self.wrong_predictions
+
+    def tweets_between(self, start, end) -> np.ndarray:
+        """
+        Returns ids of the tweets created at start or later and before end (sorted).
+        start and end are datetime64 or ISO strings (e.g. "2021-05-03"), in the time zone of the index.
+        :param start: np.datetime64
+        :param end: np.datetime64
+        :return: tweet_ids: np.ndarray
+        """
+        in_range = (self.timestamps >= np.datetime64(start)) & (self.timestamps < np.datetime64(end))
+        return self.dated_tweets[in_range]
+
+    @staticmethod
+    def intersect(*tweet_id_lists) -> np.ndarray:
+        """
+        Returns ids of the tweets contained in all given lists of tweet ids (e.g. a user's wrongly classified tweets).
+        :param tweet_id_lists: np.ndarray
+        :return: tweet_ids: np.ndarray
+        """
+        tweet_ids = np.asarray(tweet_id_lists[0], dtype=np.int64)
+        for other_tweet_ids in tweet_id_lists[1:]:
+            tweet_ids = np.intersect1d(tweet_ids, other_tweet_ids)
+        return tweet_ids
+
+    def num_words(self) -> int:
+        """
+        Returns number of different words with postings (with token columns, words holds the whole string table).
+        :return: num_words: int
+        """
+        return int(np.count_nonzero(np.diff(self.word_offsets)))
+
+    def subset_postings(self, tweet_ids=None) -> np.ndarray:
+        """
+        Returns positions of the postings of the tweets tweet_ids (default: all tweets) in order of the tweet list.
+        Only the postings of these tweets are gathered (see tweet_offsets), the others aren't read.
+        :param tweet_ids: iterable of int
+        :return: positions: np.ndarray
+        """
+        if tweet_ids is None:
+            return np.arange(len(self.posting_tweets), dtype=np.int64)
+        tweet_ids = np.unique(np.asarray(tweet_ids, dtype=np.int64))
+        starts = self.tweet_offsets[tweet_ids]
+        lengths = self.tweet_offsets[tweet_ids + 1] - starts
+        subset_starts = np.cumsum(lengths) - lengths  # start of each tweet's postings in the result
+        return np.arange(lengths.sum(), dtype=np.int64) - np.repeat(subset_starts - starts, lengths)
+
+    def word_frequencies(self, tweet_ids=None) -> dict:
+        """
+        Returns {word: frequency} of the tweets tweet_ids (default: all tweets), in order of the first occurrence
+        of each word in these tweets (taken in order of the tweet list) like a dict filled token by token.
+        Only the postings of these tweets are counted (see subset_postings), with one bincount.
+        :param tweet_ids: iterable of int
+        :return: words_frequency: dict
+        """
+        positions = self.subset_postings(tweet_ids)
+        codes, first_positions, subset_codes = np.unique(self.posting_words[positions], return_index=True,
+                                                         return_inverse=True)
+        counts = np.bincount(subset_codes.reshape(-1), weights=self.posting_counts[positions], minlength=len(codes))
+        order = np.argsort(first_positions, kind="stable")
+        return {self.words[code]: int(count) for code, count in zip(codes[order].tolist(), counts[order].tolist())}
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import sqlite3
+import unicodedata
+import numpy as np
+from feature_store import TWEET_REPRESENTATIONS  # same row layout as the feature sidecar
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes tweet text for the cache key (unicode NFC, so differently encoded umlauts etc. share one entry).
+    Nothing else is changed, because spacy's tokens depend on every character of the text.
+    :param text: str
+    :return: normalized_text: str
+    """
+    return unicodedata.normalize("NFC", text)
+
+
+def make_fingerprint(*parts) -> str:
+    """
+    Returns hash over all parts (model, embeddings, spacy pipeline, ...) that influence the preprocessing results.
+    Cache entries are only valid for the same fingerprint.
+    :param parts: str
+    :return: fingerprint: str
+    """
+    return hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class TweetCache():
+    """
+    Persistent local cache (sqlite) of preprocessing results per tweet text:
+    token attributes, the pooled tweet vectors (tweetmax, tweetmin, tweetavg) and the predicted sentiment.
+    Entries are addressed by a hash of the normalized text and the fingerprint of model and representation,
+    so retweets and copied tweets are only tagged, embedded and classified once.
+    Several processes can share one cache file: it is opened in WAL mode (reads never wait for a writer)
+    and new entries are buffered and written in one short transaction by commit().
+    """
+
+    def __init__(self, cache_path: str, fingerprint: str):
+        self.cache_path = cache_path
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self.new_entries = {}  # key -> (key, tokens, vectors, sentiment) row not written yet
+        self.connection = sqlite3.connect(cache_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tweets "
+                                "(key TEXT PRIMARY KEY, tokens TEXT, vectors BLOB, sentiment INTEGER)")
+
+    def key(self, text: str) -> str:
+        """
+        Returns the cache key of a tweet text.
+        :param text: str
+        :return: key: str
+        """
+        return hashlib.sha1((self.fingerprint + "\0" + normalize_text(text)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict:
+        """
+        Returns cached entry {"tokens": list, "vectors": dict or None, "sentiment": int or None} or None on a miss.
+        "vectors" is None for tweets without any token in fastText (those tweets are dropped).
+        :param key: str
+        :return: entry: dict
+        """
+        if key in self.new_entries:
+            row = self.new_entries[key][1:]
+        else:
+            row = self.connection.execute("SELECT tokens, vectors, sentiment FROM tweets WHERE key = ?",
+                                          (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        tokens, vectors_blob, sentiment = row
+        vectors = None
+        if vectors_blob is not None:
+            vectors_array = np.frombuffer(vectors_blob, dtype=np.float32).reshape(len(TWEET_REPRESENTATIONS), -1)
+            vectors = dict(zip(TWEET_REPRESENTATIONS, vectors_array))
+        return {"tokens": json.loads(tokens), "vectors": vectors, "sentiment": sentiment}
+
+    def put(self, key: str, tokens: list, vectors: dict, sentiment: int) -> None:
+        """
+        Saves preprocessing results of a tweet. They are buffered in memory, call commit() to write them.
+        :param key: str
+        :param tokens: list
+        :param vectors: dict or None
+        :param sentiment: int or None
+        :return: None
+        """
+        vectors_blob = None
+        if vectors is not None:
+            vectors_blob = np.stack([vectors[tweet_representation] for tweet_representation in TWEET_REPRESENTATIONS])\
+                .astype(np.float32).tobytes()
+        self.new_entries[key] = (key, json.dumps(tokens), vectors_blob, sentiment)
+
+    def commit(self) -> None:
+        """
+        Writes all new entries to disk in one transaction, so the write lock is only held while writing.
+        :return: None
+        """
+        if self.new_entries:
+            self.connection.executemany("INSERT OR REPLACE INTO tweets VALUES (?, ?, ?, ?)",
+                                        list(self.new_entries.values()))
+            self.new_entries = {}
+        self.connection.commit()
+
+    def hit_rate(self) -> float:
+        """
+        Returns share of lookups that were answered from the cache.
+        :return: hit_rate: float
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def print_hit_rate(self) -> None:
+        """
+        Prints number of hits and misses and the hit rate.
+        :return: None
+        """
+        print("Preprocessing cache:", self.hits, "hits,", self.misses, "misses -> hit rate",
+              str(round(self.hit_rate() * 100, 1)) + "%")
+
+    def close(self) -> None:
+        """
+        Commits and closes the cache.
+        :return: None
+        """
+        self.commit()
+        self.connection.close()
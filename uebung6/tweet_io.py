@@ -0,0 +1,195 @@
+import json
+import os
+
+READ_CHUNK_SIZE = 1 << 20  # characters read from file at once when parsing a json array incrementally
+
+
+def iter_tweets(infile_path: str):
+    """
+    Yields the tweets of a file one by one without loading the whole file.
+    Supports json files holding one array of tweets (parsed incrementally)
+    and JSON Lines files holding one tweet per line.
+    :param infile_path: str
+    :return: generator of dict
+    """
+    with open(infile_path, mode="r", encoding="utf-8") as fin:
+        buffer = fin.read(READ_CHUNK_SIZE).lstrip()
+        if buffer.startswith("["):
+            yield from _iter_json_array(fin, buffer[1:])
+        else:
+            # JSON Lines: put back the already read part in front of the remaining lines
+            first_lines = buffer.split("\n")
+            rest_of_line = fin.readline()
+            first_lines[-1] += rest_of_line
+            for line in first_lines:
+                if line.strip():
+                    yield json.loads(line)
+            for line in fin:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def iter_fields(infile_path: str, fields):
+    """
+    Yields the tweets of a file one by one (see iter_tweets) with only the given fields of each tweet,
+    so the other (large) fields are dropped right after decoding. Missing fields are left out.
+    :param infile_path: str
+    :param fields: iterable of str
+    :return: generator of dict
+    """
+    fields = tuple(fields)
+    for tweet in iter_tweets(infile_path):
+        yield {field: tweet[field] for field in fields if field in tweet}
+
+
+def _iter_json_array(fin, buffer: str):
+    """
+    Decodes the elements of a json array one at a time. buffer holds the text read after the opening "[".
+    """
+    decoder = json.JSONDecoder()
+    position = 0
+    expect_separator = False
+    while True:
+        # skip white space, read more text if buffer is used up
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = fin.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("Unexpected end of json array in " + fin.name)
+            buffer, position = chunk, 0
+
+        if buffer[position] == "]":
+            return
+        if expect_separator:
+            if buffer[position] != ",":
+                raise ValueError("Expected ',' between elements of json array in " + fin.name)
+            position += 1
+            expect_separator = False
+            continue
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # element not completely in buffer yet -> read more text and try again
+            chunk = fin.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        yield element
+        position = end
+        expect_separator = True
+
+
+class TweetWriter():
+    """
+    Writes tweets one by one to a file, so processed tweets don't have to be kept in memory.
+    Files ending with ".jsonl" (also ".jsonl.part") are written as JSON Lines (one tweet per line),
+    all other files as one json array with the same formatting as json.dumps(tweets_list, indent=indent).
+    If resume_state (see checkpoint()) is given, the file is cut back to that state and continued.
+    """
+
+    def __init__(self, outfile_path: str, indent: int = None, resume_state: dict = None):
+        self.outfile_path = outfile_path
+        self.indent = indent
+        self.json_lines = outfile_path.endswith(".jsonl") or outfile_path.endswith(".jsonl.part")
+        if resume_state is not None:
+            self.num_written = resume_state["num_written"]
+            self.fout = open(outfile_path, mode="r+b")
+            self.fout.truncate(resume_state["output_bytes"])
+            self.fout.seek(0, os.SEEK_END)
+        else:
+            self.num_written = 0
+            self.fout = open(outfile_path, mode="wb")
+            if not self.json_lines:
+                self.fout.write(b"[")
+
+    def write(self, tweet: dict) -> None:
+        """
+        Appends tweet to file.
+        :param tweet: dict
+        :return: None
+        """
+        if self.json_lines:
+            element = json.dumps(tweet) + "\n"
+        elif self.indent is None:
+            element = (", " if self.num_written else "") + json.dumps(tweet)
+        else:
+            prefix = ",\n" if self.num_written else "\n"
+            element = prefix + " " * self.indent + \
+                json.dumps(tweet, indent=self.indent).replace("\n", "\n" + " " * self.indent)
+        self.fout.write(element.encode("utf-8"))
+        self.num_written += 1
+
+    def checkpoint(self) -> dict:
+        """
+        Flushes everything written so far to disk and returns the state needed to resume writing at this point.
+        :return: state: dict
+        """
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+        return {"output_bytes": self.fout.tell(), "num_written": self.num_written}
+
+    def close(self) -> None:
+        """
+        Closes the json array (if not JSON Lines) and the file.
+        :return: None
+        """
+        if not self.json_lines:
+            self.fout.write(b"\n]" if self.indent is not None and self.num_written else b"]")
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def save_checkpoint(checkpoint_path: str, job: dict, input_tweets: int, writer: TweetWriter,
+                    feature_writer=None, token_writer=None) -> None:
+    """
+    Saves how many input tweets are completely processed and written, together with the state of the writer
+    (and the state of the feature and token sidecars, if a feature_store.FeatureWriter
+    or token_columns.TokenColumnsWriter is given).
+    job describes the run (e.g. input file and settings), so a checkpoint is only resumed by the same run.
+    The checkpoint file is replaced atomically.
+    :param checkpoint_path: str
+    :param job: dict
+    :param input_tweets: int
+    :param writer: TweetWriter
+    :param feature_writer: feature_store.FeatureWriter
+    :param token_writer: token_columns.TokenColumnsWriter
+    :return: None
+    """
+    state = {"job": job, "input_tweets": input_tweets}
+    state.update(writer.checkpoint())
+    if feature_writer is not None:
+        state["feature_rows"] = feature_writer.checkpoint()
+    if token_writer is not None:
+        state["token_columns"] = token_writer.checkpoint()
+    with open(checkpoint_path + ".tmp", mode="w", encoding="utf-8") as fout:
+        json.dump(state, fout)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path: str, job: dict, part_path: str) -> dict:
+    """
+    Returns the saved checkpoint if it belongs to the same job and the partly written outfile still exists,
+    otherwise None (-> start from the beginning).
+    :param checkpoint_path: str
+    :param job: dict
+    :param part_path: str
+    :return: state: dict or None
+    """
+    if not os.path.isfile(checkpoint_path) or not os.path.isfile(part_path):
+        return None
+    with open(checkpoint_path, mode="r", encoding="utf-8") as fin:
+        state = json.load(fin)
+    if state.get("job") != job or os.path.getsize(part_path) < state["output_bytes"]:
+        return None
+    return state
@@ -0,0 +1,259 @@
+import itertools
+import json
+import os
+import numpy as np
+import analyzation_helpers
+import time_buckets
+import token_columns
+import tweet_io
+
+# statistics of the summary and the tweet fields they are computed from
+STATISTIC_FIELDS = {"sentiments": ("predicted-sentiment",),
+                    "pos": ("tokens-pos-attributes", "tokens-row"),
+                    "hashtags": ("hashtags", "predicted-sentiment"),
+                    "users": ("author_name", "predicted-sentiment", "created_at"),
+                    "days_hours": ("created_at",)}
+
+CHUNK_SIZE = 4096  # tweets added together: their dates are parsed and POS tags in token columns counted at once
+
+# counters of the summary (dicts), saved as lists of [key, value] pairs to keep their order
+COUNTERS = ("pos_counts", "hashtags_frequency", "hashtags_sentiments", "users_frequency", "users_sentiments",
+            "users_tweet_days", "hour_counts")
+
+
+def sentiment_index(sentiment: int) -> int:
+    """
+    Returns position of a predicted sentiment in the [negative, neutral, positive] count lists.
+    :param sentiment: int
+    :return: index: int
+    """
+    if sentiment == 0:
+        return 0
+    elif sentiment == 1:
+        return 1
+    return 2
+
+
+class TweetSummary():
+    """
+    Computes all statistics needed for the plots in one pass over the tweets:
+    sentiment counts, POS counts, frequency of hashtags and users with their sentiments (and weekdays for users)
+    and the number of tweets in each hour.
+    Only the statistics given (see STATISTIC_FIELDS, default: all) are computed. The tweets are added in chunks,
+    the dates of a chunk are parsed at once and bucketed by hour with NumPy (see time_buckets.py).
+    The methods return the same results as the corresponding functions in analyzation_helpers.
+    Summaries can be saved, loaded, updated with new tweets and merged: merging the summaries of two batches
+    gives the same summary as one pass over both batches (in that order).
+    """
+
+    def __init__(self, statistics=None, columns=None):
+        self.statistics = tuple(STATISTIC_FIELDS) if statistics is None else tuple(statistics)
+        self.columns = columns  # token_columns.TokenColumns if the tokens are saved in token columns
+        self.num_tweets = 0
+        self.sentiment_counts = [0, 0, 0]  # negative, neutral, positive
+        self.pos_counts = {}
+        self.hashtags_frequency = {}
+        self.hashtags_sentiments = {}  # hashtag -> [negative, neutral, positive]
+        self.users_frequency = {}
+        self.users_sentiments = {}  # user -> [negative, neutral, positive]
+        self.users_tweet_days = {}  # user -> number of tweets on each weekday (Monday = 0)
+        self.hour_counts = {}  # hour (hours since 1970-01-01 in the time of "created_at") -> number of tweets
+
+    def fields(self) -> list:
+        """
+        Returns the tweet fields needed for the statistics of the summary.
+        :return: fields: list
+        """
+        fields = []
+        for statistic in self.statistics:
+            fields.extend(field for field in STATISTIC_FIELDS[statistic] if field not in fields)
+        return fields
+
+    def add(self, tweet: dict) -> None:
+        """
+        Adds one tweet to all statistics of the summary (use add_tweets for many tweets).
+        :param tweet: dict
+        :return: None
+        """
+        self._add_chunk([tweet])
+
+    def add_tweets(self, tweets):
+        """
+        Adds all tweets (list or any iterable, e.g. tweet_io.iter_tweets) to the summary in chunks of CHUNK_SIZE
+        tweets and returns the summary.
+        :param tweets: iterable of dict
+        :return: summary: TweetSummary
+        """
+        tweets = iter(tweets)
+        for chunk in iter(lambda: list(itertools.islice(tweets, CHUNK_SIZE)), []):
+            self._add_chunk(chunk)
+        return self
+
+    def _add_chunk(self, tweets: list) -> None:
+        self.num_tweets += len(tweets)
+        if "sentiments" in self.statistics or "hashtags" in self.statistics or "users" in self.statistics:
+            sentiments = [sentiment_index(tweet["predicted-sentiment"]) for tweet in tweets]
+        if "sentiments" in self.statistics:
+            self.sentiment_counts = [count + chunk_count for count, chunk_count
+                                     in zip(self.sentiment_counts, np.bincount(sentiments, minlength=3).tolist())]
+
+        if "pos" in self.statistics:
+            if self.columns is not None:
+                positions = self.columns.positions([tweet["tokens-row"] for tweet in tweets])
+                for pos_token, count in self.columns.count_values("pos", positions).items():
+                    self.pos_counts[pos_token] = self.pos_counts.get(pos_token, 0) + count
+            else:
+                for tweet in tweets:
+                    for token in tweet["tokens-pos-attributes"]:
+                        pos_token = token.get("pos")
+                        self.pos_counts[pos_token] = self.pos_counts.get(pos_token, 0) + 1
+
+        if "hashtags" in self.statistics:
+            for tweet, sentiment in zip(tweets, sentiments):
+                for hashtag in tweet["hashtags"]:
+                    self.hashtags_frequency[hashtag] = self.hashtags_frequency.get(hashtag, 0) + 1
+                    self.hashtags_sentiments.setdefault(hashtag, [0, 0, 0])[sentiment] += 1
+
+        if "users" in self.statistics or "days_hours" in self.statistics:
+            times = time_buckets.parse_created_at(tweet["created_at"] for tweet in tweets)
+
+        if "users" in self.statistics:
+            for tweet, sentiment, weekday in zip(tweets, sentiments, time_buckets.weekdays(times).tolist()):
+                user = tweet["author_name"]
+                self.users_frequency[user] = self.users_frequency.get(user, 0) + 1
+                self.users_sentiments.setdefault(user, [0, 0, 0])[sentiment] += 1
+                self.users_tweet_days.setdefault(user, [0] * 7)[weekday] += 1
+
+        if "days_hours" in self.statistics:
+            hours, counts = np.unique(times.astype("datetime64[h]").astype(np.int64), return_counts=True)
+            for hour, count in zip(hours.tolist(), counts.tolist()):
+                self.hour_counts[hour] = self.hour_counts.get(hour, 0) + count
+
+    @classmethod
+    def from_file(cls, infile_path: str, statistics=None, columns=None):
+        """
+        Reads the tweets of a preprocessed file one by one, keeping only the fields needed for the statistics
+        (see fields), and returns their summary.
+        """
+        summary = cls(statistics, columns)
+        return summary.add_tweets(tweet_io.iter_fields(infile_path, summary.fields()))
+
+    def update(self, tweets):
+        """
+        Adds new tweets (e.g. a new batch) to the summary and returns the summary, same as add_tweets.
+        :param tweets: iterable of dict
+        :return: summary: TweetSummary
+        """
+        return self.add_tweets(tweets)
+
+    def merge(self, other):
+        """
+        Adds the counts of another summary with the same statistics to this one and returns this summary.
+        Keys new to this summary are appended in the other summary's order, so ties in the top lists are decided
+        as if the other summary's tweets had been added after this summary's tweets.
+        :param other: TweetSummary
+        :return: summary: TweetSummary
+        """
+        if set(other.statistics) != set(self.statistics):
+            raise ValueError("Can't merge summaries of different statistics: " + str(self.statistics) + " and " +
+                             str(other.statistics))
+        self.num_tweets += other.num_tweets
+        self.sentiment_counts = [count + other_count for count, other_count
+                                 in zip(self.sentiment_counts, other.sentiment_counts)]
+        for counter_name in COUNTERS:
+            counter = getattr(self, counter_name)
+            for key, value in getattr(other, counter_name).items():
+                if key not in counter:
+                    counter[key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    counter[key] = [count + other_count for count, other_count in zip(counter[key], value)]
+                else:
+                    counter[key] += value
+        return self
+
+    def save(self, summary_path: str) -> None:
+        """
+        Saves the summary as json file (replaced atomically).
+        :param summary_path: str
+        :return: None
+        """
+        state = {"statistics": list(self.statistics), "num_tweets": self.num_tweets,
+                 "sentiment_counts": self.sentiment_counts}
+        for counter_name in COUNTERS:
+            state[counter_name] = [[key, value] for key, value in getattr(self, counter_name).items()]
+        with open(summary_path + ".tmp", mode="w", encoding="utf-8") as fout:
+            json.dump(state, fout)
+        os.replace(summary_path + ".tmp", summary_path)
+
+    @classmethod
+    def load(cls, summary_path: str, columns=None):
+        """
+        Loads a summary saved with save(). columns (token_columns.TokenColumns) is needed to add further tweets
+        whose tokens are saved in token columns.
+        """
+        with open(summary_path, mode="r", encoding="utf-8") as fin:
+            state = json.load(fin)
+        summary = cls(state["statistics"], columns)
+        summary.num_tweets = state["num_tweets"]
+        summary.sentiment_counts = state["sentiment_counts"]
+        for counter_name in COUNTERS:
+            setattr(summary, counter_name, {key: value for key, value in state[counter_name]})
+        return summary
+
+    def most_active_users(self) -> (list, list):
+        """
+        Returns the 10 most active users with the sentiments of their tweets and with their tweets on each weekday
+        (see analyzation_helpers.analyze_most_active_users).
+        :return: (most_active_users_sentiments, most_active_users_tweet_days): tuple(list, list)
+        """
+        print("Top 10 most active users:")
+        most_active_users = analyzation_helpers.get_top10(self.users_frequency)
+        most_active_users_sentiments = [(user, self.users_sentiments.get(user)) for user, frequency in most_active_users]
+        most_active_users_tweet_days = [(user, self.users_tweet_days.get(user)) for user, frequency in most_active_users]
+        return most_active_users_sentiments, most_active_users_tweet_days
+
+    def most_frequent_hashtags(self) -> (list, list):
+        """
+        Returns the 10 most frequent hashtags with their frequency and with the sentiments of their tweets
+        (see analyzation_helpers.analyze_most_frequent_hashtags).
+        :return: (most_frequent_hashtags, most_frequent_hashtags_sentiments): tuple(list, list)
+        """
+        print("\nMost frequent hashtags in tweet list:")
+        most_frequent_hashtags = analyzation_helpers.get_top10(self.hashtags_frequency)
+        most_frequent_hashtags_sentiments = [(hashtag, self.hashtags_sentiments.get(hashtag))
+                                             for hashtag, frequency in most_frequent_hashtags]
+        return most_frequent_hashtags, most_frequent_hashtags_sentiments
+
+    def daily_hourly_frequency(self) -> (dict, dict):
+        """
+        Returns the average number of tweets on each weekday and in each of the 168 hours of a week
+        (see analyzation_helpers.get_tweet_daily_hourly_frequency). Weekdays without any tweet have average 0.
+        :return: (weekday_tweet_avg, hour_tweet_avg): tuple(dict, dict)
+        """
+        hours = np.array(list(self.hour_counts), dtype=np.int64).astype("datetime64[h]")
+        counts = np.array(list(self.hour_counts.values()), dtype=np.int64)
+        return time_buckets.week_bin_averages(hours, np.timedelta64(1, "D"), counts), \
+            time_buckets.week_bin_averages(hours, np.timedelta64(1, "h"), counts)
+
+
+def update_saved_summary(summary_path: str, infile_path: str, statistics=None, columns=None) -> TweetSummary:
+    """
+    Loads the summary saved at summary_path (or starts a new one with the given statistics),
+    adds only the tweets of infile_path (a new batch), saves and returns the updated summary.
+    columns are the token columns of infile_path, loaded from its sidecar files if not given
+    (None if the tokens are saved as dicts in the file).
+    :param summary_path: str
+    :param infile_path: str
+    :param statistics: iterable of str
+    :param columns: token_columns.TokenColumns
+    :return: summary: TweetSummary
+    """
+    if columns is None:
+        columns = token_columns.load_token_columns(infile_path)
+    if os.path.isfile(summary_path):
+        summary = TweetSummary.load(summary_path, columns)
+    else:
+        summary = TweetSummary(statistics, columns)
+    summary.update(tweet_io.iter_fields(infile_path, summary.fields()))
+    summary.save(summary_path)
+    return summary
@@ -4,6 +4,8 @@ import os
 import time
 import torch
 import preprocessor
+import token_columns
+import token_index
 import analyzation_helpers
 import plotter_uebung6
 import disambiguation_iaa
@@ -22,9 +24,19 @@ def main():
     test_tweet_file = path_to_data + "filtered_test.json"
     twitter_dataset_file = path_to_data + "Twitter_Datensatz.json"
     disambiguation_file = path_to_data + "Disambiguierung.json"
+    preprocessing_cache_file = path_to_data + "preprocessing_cache.sqlite"
+    test_tweet_file_preprocessed = path_to_results + "/filtered_test_preprocessed_for_uebung6.json"
+    evaluation_filepath = path_to_results + "Auswertung_Twitter_Uebung6.json"
 
-    # Instantiatiate Tweet Preprocessor
-    data_preprocessor = preprocessor.TweetPreprocessor(embeddings_file)
+    # Instantiatiate Tweet Preprocessor (only with the embeddings of tokens occurring in the datasets)
+    # only if a dataset still has to be preprocessed, analysis runs need neither spacy nor the raw datasets
+    datasets_to_preprocess = [dataset_file for dataset_file, preprocessed_file
+                              in [(test_tweet_file, test_tweet_file_preprocessed),
+                                  (twitter_dataset_file, evaluation_filepath)]
+                              if not os.path.isfile(preprocessed_file)]
+    data_preprocessor = None
+    if datasets_to_preprocess:
+        data_preprocessor = preprocessor.TweetPreprocessor(embeddings_file, datasets_to_preprocess)
     
     # Best model and its hyperparameters was saved in the code in Uebung5
     # Load best model:
@@ -44,27 +56,33 @@ def main():
     print("---------> Preprocessing filtered_test.json")
     print("***********************************************************************************************************")
 
-    test_tweet_file_preprocessed = path_to_results + "/filtered_test_preprocessed_for_uebung6.json"
     if not os.path.isfile(test_tweet_file_preprocessed):
         # Use preprocess_dataset method to write the sentiments and pos tagging to preprocessed dataset file
         data_preprocessor.preprocess_with_prediction(test_tweet_file, test_tweet_file_preprocessed, best_model,
-                                                     best_tweet_representation)
+                                                     best_tweet_representation, cache_path=preprocessing_cache_file,
+                                                     columnar_tokens=True)
 
     with open(test_tweet_file_preprocessed, mode="r", encoding="utf-8") as fin:
         tweets_list = json.loads(fin.read())
 
+        print("\nIndexing tokens, hashtags, users and dates of all tweets...\n")
+        tweet_index = token_index.TokenIndex.from_tweets(
+            tweets_list, token_columns.load_token_columns(test_tweet_file_preprocessed))
+        print("Done: Indexed", tweet_index.num_tweets, "tweets with", tweet_index.num_words(), "different words!")
+
         print("\nCollecting all wrongly classified tweets...\n")
         time.sleep(5)
-        wrongly_classified_tweets_list = analyzation_helpers.get_wrongly_classified_tweets(tweets_list)
-        print("Done: Collected all wrongly classified tweets!")
+        wrongly_classified_tweet_ids = tweet_index.wrongly_classified_tweets()
+        print("Done: Collected all", len(wrongly_classified_tweet_ids), "wrongly classified tweets!")
 
         print("\n***********************************************************************************************************")
         print("Sheet 6 Exercise 1.1:")
         print("--------->Creating Top 10 list of most frequent words in wrongly classified tweets...")
         print("***********************************************************************************************************")
         time.sleep(5)
-        most_common_wrongly_classified_words = analyzation_helpers.get_most_frequent_words(
-            wrongly_classified_tweets_list)
+        # words of further subsets come from the same index, e.g. tweet_index.tweets_with_hashtag(hashtag)
+        most_common_wrongly_classified_words = analyzation_helpers.get_most_frequent_words_in_subset(
+            tweet_index, wrongly_classified_tweet_ids)
         print("\nTop 10 list of most frequent words in wrongly classified tweets: ")
         print(most_common_wrongly_classified_words)
 
@@ -86,12 +104,14 @@ def main():
     print("***********************************************************************************************************")
 
 
-    evaluation_filepath = path_to_results + "Auswertung_Twitter_Uebung6.json"
-
     if not os.path.isfile(evaluation_filepath):
         # Use preprocess_dataset method to write the sentiments and pos tagging to preprocessed dataset file
+        # (file only exists when preprocessing is complete, interrupted runs continue from their last checkpoint)
+        # the tweet vectors of all representations are saved next to it, so for another model use
+        # preprocessor.repredict_file(evaluation_filepath, model, tweet_representation) instead of preprocessing again
         data_preprocessor.preprocess_with_prediction(twitter_dataset_file, evaluation_filepath, best_model,
-                                                     best_tweet_representation)
+                                                     best_tweet_representation, cache_path=preprocessing_cache_file,
+                                                     columnar_tokens=True)
 
     # Exercise 3
     print("\n\n***********************************************************************************************************")